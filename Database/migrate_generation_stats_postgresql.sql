@@ -0,0 +1,31 @@
+-- ============================================
+-- MIGRATION : STATISTIQUES DE GÉNÉRATION
+-- ============================================
+-- Crée sur une base existante les tables des temps de génération
+-- (generation_runs, generation_phase_stats) lues par
+-- /api/periodes/<pid>/generation_stats.
+-- Idempotente : peut être rejouée sans effet sur une base déjà à jour.
+
+-- Table des exécutions de génération (une ligne par génération)
+CREATE TABLE IF NOT EXISTS generation_runs (
+  id_run SERIAL PRIMARY KEY,
+  id_periode INTEGER NOT NULL,
+  started_at TIMESTAMP NOT NULL DEFAULT NOW(),
+  total_seconds DECIMAL(10, 4),
+  exams_placed INTEGER,
+  exams_skipped INTEGER,
+  FOREIGN KEY (id_periode) REFERENCES periodes_examens(id_periode) ON DELETE CASCADE
+);
+
+-- Table des temps par phase d'une génération
+CREATE TABLE IF NOT EXISTS generation_phase_stats (
+  id_run INTEGER NOT NULL,
+  phase VARCHAR(50) NOT NULL,
+  seconds DECIMAL(10, 4) NOT NULL,
+  calls INTEGER NOT NULL,
+  PRIMARY KEY (id_run, phase),
+  FOREIGN KEY (id_run) REFERENCES generation_runs(id_run) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_generation_runs_periode
+ON generation_runs (id_periode, started_at);
@@ -0,0 +1,92 @@
+-- ============================================
+-- MIGRATION : VERSIONS DE PLANNING
+-- ============================================
+-- Met à niveau une base créée avant les versions de planning
+-- (plan_versions, planning_examens.id_version,
+-- periodes_examens.active_version, vue planning_examens_actifs).
+-- Idempotente : peut être rejouée sans effet sur une base déjà à jour.
+--
+-- Le planning existant de chaque période devient sa première version, active.
+
+CREATE TABLE IF NOT EXISTS plan_versions (
+  id_version SERIAL PRIMARY KEY,
+  id_periode INTEGER NOT NULL,
+  status VARCHAR(10) NOT NULL DEFAULT 'staging'
+    CHECK (status IN ('staging', 'active', 'retired', 'failed')),
+  created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+  activated_at TIMESTAMP DEFAULT NULL,
+  exams_placed INTEGER,
+  exams_skipped INTEGER,
+  input_fingerprint CHAR(64),
+  FOREIGN KEY (id_periode) REFERENCES periodes_examens(id_periode) ON DELETE CASCADE
+);
+
+ALTER TABLE periodes_examens
+  ADD COLUMN IF NOT EXISTS active_version INTEGER DEFAULT NULL
+  REFERENCES plan_versions(id_version) ON DELETE SET NULL;
+
+ALTER TABLE planning_examens
+  ADD COLUMN IF NOT EXISTS id_version INTEGER DEFAULT NULL
+  REFERENCES plan_versions(id_version);
+
+CREATE INDEX IF NOT EXISTS idx_pe_version
+ON planning_examens (id_version);
+
+CREATE OR REPLACE VIEW planning_examens_actifs AS
+SELECT pe.*
+FROM planning_examens pe
+JOIN creneaux c ON c.id_creneau = pe.id_creneau
+JOIN periodes_examens p ON p.id_periode = c.id_periode
+WHERE pe.id_version IS NOT DISTINCT FROM p.active_version;
+
+CREATE OR REPLACE FUNCTION period_has_planning(p_id_periode INTEGER)
+RETURNS BOOLEAN AS $$
+DECLARE
+    has_planning BOOLEAN;
+BEGIN
+    SELECT EXISTS (
+        SELECT 1
+        FROM planning_examens_actifs pe
+        JOIN creneaux c ON c.id_creneau = pe.id_creneau
+        WHERE c.id_periode = p_id_periode
+        LIMIT 1
+    ) INTO has_planning;
+
+    RETURN has_planning;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Reprise : les lignes sans version d'une période sans version active
+-- forment une version active
+DO $$
+DECLARE
+    r RECORD;
+    v INTEGER;
+BEGIN
+    FOR r IN
+        SELECT c.id_periode, COUNT(DISTINCT pe.id_examen) AS exams
+        FROM planning_examens pe
+        JOIN creneaux c ON c.id_creneau = pe.id_creneau
+        JOIN periodes_examens p ON p.id_periode = c.id_periode
+        WHERE pe.id_version IS NULL
+        AND p.active_version IS NULL
+        GROUP BY c.id_periode
+        ORDER BY c.id_periode
+    LOOP
+        INSERT INTO plan_versions (id_periode, status, activated_at, exams_placed)
+        VALUES (r.id_periode, 'active', NOW(), r.exams)
+        RETURNING id_version INTO v;
+
+        UPDATE planning_examens pe
+        SET id_version = v
+        FROM creneaux c
+        WHERE c.id_creneau = pe.id_creneau
+        AND c.id_periode = r.id_periode
+        AND pe.id_version IS NULL;
+
+        UPDATE periodes_examens
+        SET active_version = v
+        WHERE id_periode = r.id_periode;
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,48 @@
+-- ============================================
+-- MIGRATION : VERSION DES DONNÉES DE RÉFÉRENCE
+-- ============================================
+-- Crée sur une base existante la version des données de référence
+-- (une seule ligne) et les triggers qui l'incrémentent à chaque
+-- modification des tables lues par le générateur (cache de
+-- generate_assign.py). Sans elle, le cache reste désactivé.
+-- Idempotente : peut être rejouée sans effet sur une base déjà à jour.
+
+CREATE TABLE IF NOT EXISTS reference_data_version (
+  id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  version BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO reference_data_version (id, version) VALUES (1, 0)
+ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_reference_data_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE reference_data_version
+    SET version = version + 1,
+        updated_at = NOW()
+    WHERE id = 1;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY[
+        'creneaux', 'lieux_examen', 'departements', 'formations', 'groupes',
+        'modules', 'examens', 'professeurs', 'inscriptions'
+    ] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_%s_reference_version ON %I', t, t);
+        EXECUTE format(
+            'CREATE TRIGGER trg_%s_reference_version
+             AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I
+             FOR EACH STATEMENT EXECUTE FUNCTION bump_reference_data_version()',
+            t, t
+        );
+    END LOOP;
+END;
+$$;
@@ -137,7 +137,7 @@ DECLARE
 BEGIN
     SELECT EXISTS (
         SELECT 1
-        FROM planning_examens pe
+        FROM planning_examens_actifs pe
         JOIN creneaux c ON c.id_creneau = pe.id_creneau
         WHERE c.id_periode = p_id_periode
         LIMIT 1
@@ -146,3 +146,40 @@ BEGIN
     RETURN has_planning;
 END;
 $$ LANGUAGE plpgsql;
+
+-- ============================================
+-- REFERENCE DATA VERSION (generator cache)
+-- ============================================
+-- Any change to a table read by the planning generator bumps
+-- reference_data_version, which invalidates the generator's cached copy
+
+CREATE OR REPLACE FUNCTION bump_reference_data_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE reference_data_version
+    SET version = version + 1,
+        updated_at = NOW()
+    WHERE id = 1;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY[
+        'creneaux', 'lieux_examen', 'departements', 'formations', 'groupes',
+        'modules', 'examens', 'professeurs', 'inscriptions'
+    ] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_%s_reference_version ON %I', t, t);
+        EXECUTE format(
+            'CREATE TRIGGER trg_%s_reference_version
+             AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I
+             FOR EACH STATEMENT EXECUTE FUNCTION bump_reference_data_version()',
+            t, t
+        );
+    END LOOP;
+END;
+$$;
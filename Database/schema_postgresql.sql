@@ -107,17 +107,51 @@ CREATE TABLE lieux_examen (
 -- PLANNING DES EXAMENS
 -- ============================================
 
+-- Table des versions de planning d'une période : chaque génération écrit
+-- une nouvelle version ('staging'), activée d'un coup une fois vérifiée ;
+-- les versions précédentes ('retired') restent disponibles pour rollback
+CREATE TABLE plan_versions (
+  id_version SERIAL PRIMARY KEY,
+  id_periode INTEGER NOT NULL,
+  status VARCHAR(10) NOT NULL DEFAULT 'staging'
+    CHECK (status IN ('staging', 'active', 'retired', 'failed')),
+  created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+  activated_at TIMESTAMP DEFAULT NULL,
+  exams_placed INTEGER,
+  exams_skipped INTEGER,
+  -- Empreinte SHA-256 des entrées (generate_assign.input_fingerprint),
+  -- NULL une fois la version modifiée par une mise à jour incrémentale
+  input_fingerprint CHAR(64),
+  FOREIGN KEY (id_periode) REFERENCES periodes_examens(id_periode) ON DELETE CASCADE
+);
+
+-- Version visible par les lecteurs
+ALTER TABLE periodes_examens
+  ADD COLUMN active_version INTEGER DEFAULT NULL
+  REFERENCES plan_versions(id_version) ON DELETE SET NULL;
+
 -- Table du planning des examens
 CREATE TABLE planning_examens (
   id_planning SERIAL PRIMARY KEY,
   id_examen INTEGER NOT NULL,
   id_creneau INTEGER NOT NULL,
   id_lieu INTEGER NOT NULL,
+  id_version INTEGER DEFAULT NULL,
   FOREIGN KEY (id_examen) REFERENCES examens(id_examen),
   FOREIGN KEY (id_creneau) REFERENCES creneaux(id_creneau),
-  FOREIGN KEY (id_lieu) REFERENCES lieux_examen(id_lieu)
+  FOREIGN KEY (id_lieu) REFERENCES lieux_examen(id_lieu),
+  FOREIGN KEY (id_version) REFERENCES plan_versions(id_version)
 );
 
+-- Planning actif : lignes de la version active de chaque période (les
+-- lignes sans version, antérieures aux versions, tant qu'aucune n'est active)
+CREATE VIEW planning_examens_actifs AS
+SELECT pe.*
+FROM planning_examens pe
+JOIN creneaux c ON c.id_creneau = pe.id_creneau
+JOIN periodes_examens p ON p.id_periode = c.id_periode
+WHERE pe.id_version IS NOT DISTINCT FROM p.active_version;
+
 -- Table d'assignation groupes-salles
 CREATE TABLE planning_groupes (
   id_planning INTEGER,
@@ -129,6 +163,38 @@ CREATE TABLE planning_groupes (
   FOREIGN KEY (id_groupe) REFERENCES groupes(id_groupe)
 );
 
+-- Table des exécutions de génération (une ligne par génération)
+CREATE TABLE generation_runs (
+  id_run SERIAL PRIMARY KEY,
+  id_periode INTEGER NOT NULL,
+  started_at TIMESTAMP NOT NULL DEFAULT NOW(),
+  total_seconds DECIMAL(10, 4),
+  exams_placed INTEGER,
+  exams_skipped INTEGER,
+  FOREIGN KEY (id_periode) REFERENCES periodes_examens(id_periode) ON DELETE CASCADE
+);
+
+-- Table des temps par phase d'une génération
+CREATE TABLE generation_phase_stats (
+  id_run INTEGER NOT NULL,
+  phase VARCHAR(50) NOT NULL,
+  seconds DECIMAL(10, 4) NOT NULL,
+  calls INTEGER NOT NULL,
+  PRIMARY KEY (id_run, phase),
+  FOREIGN KEY (id_run) REFERENCES generation_runs(id_run) ON DELETE CASCADE
+);
+
+-- Version des données de référence (une seule ligne), incrémentée par
+-- les triggers de procedures_postgresql.sql à chaque modification des
+-- tables lues par le générateur (cache de generate_assign.py)
+CREATE TABLE reference_data_version (
+  id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  version BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO reference_data_version (id, version) VALUES (1, 0);
+
 -- ============================================
 -- PROFESSEURS ET SURVEILLANCE
 -- ============================================
@@ -224,6 +290,10 @@ CREATE INDEX idx_lieux_type ON lieux_examen(type);
 -- Index for planning_groupes
 CREATE INDEX idx_split_part ON planning_groupes(split_part);
 
+-- Index for the rows of a plan version
+CREATE INDEX IF NOT EXISTS idx_pe_version
+ON planning_examens (id_version);
+
 -- Index for planning_examens lookups (CRITICAL)
 CREATE INDEX IF NOT EXISTS idx_pe_creneau_planning
 ON planning_examens (id_creneau, id_planning);
@@ -268,6 +338,10 @@ ON surveillances (id_prof);
 CREATE INDEX IF NOT EXISTS idx_etudiants_groupe_formation
 ON etudiants (id_groupe, id_formation);
 
+-- Index for generation history per period
+CREATE INDEX IF NOT EXISTS idx_generation_runs_periode
+ON generation_runs (id_periode, started_at);
+
 -- Composite index for planning_examens with all joins
 CREATE INDEX IF NOT EXISTS idx_pe_composite
 ON planning_examens (id_examen, id_creneau, id_lieu);
@@ -1,12 +1,14 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from datetime import date
-import subprocess
-import time
 import os
-import sys
+import json
+import queue
 
 from db import query_df, get_conn
+from generation_jobs import submit_generation, get_job
+import plan_versions
+from progress_events import channel as progress_channel, is_terminal
 
 PORT = int(os.environ.get("PORT", 5000))
 DEBUG = os.environ.get("DEBUG", "False") == "True"
@@ -72,7 +74,7 @@ def periodes():
             CASE
                 WHEN EXISTS (
                     SELECT 1
-                    FROM planning_examens pe
+                    FROM planning_examens_actifs pe
                     JOIN creneaux c ON c.id_creneau = pe.id_creneau
                     WHERE c.id_periode = p.id_periode
                 ) THEN 1 ELSE 0
@@ -102,7 +104,7 @@ def sessions():
             ')' AS label
         FROM periodes_examens p
         JOIN creneaux c ON c.id_periode = p.id_periode
-        JOIN planning_examens pe ON pe.id_creneau = c.id_creneau
+        JOIN planning_examens_actifs pe ON pe.id_creneau = c.id_creneau
         JOIN examens e ON e.id_examen = pe.id_examen
         JOIN modules m ON m.id_module = e.id_module
         WHERE m.id_formation = %s AND m.annee = %s
@@ -137,7 +139,7 @@ def schedule():
             g.code_groupe                            AS GroupCode,
             pg.split_part                            AS SplitPart,
             pg.merged_groups                         AS MergedGroups
-        FROM planning_examens pe
+        FROM planning_examens_actifs pe
         JOIN examens e           ON e.id_examen = pe.id_examen
         JOIN modules m           ON m.id_module = e.id_module
         JOIN formations f        ON f.id_formation = m.id_formation
@@ -256,7 +258,7 @@ def prof_schedule():
                 END
             ) AS GroupLabel
         FROM surveillances s
-        JOIN planning_examens pe ON pe.id_planning = s.id_planning
+        JOIN planning_examens_actifs pe ON pe.id_planning = s.id_planning
         JOIN creneaux c          ON c.id_creneau = pe.id_creneau
         JOIN examens e           ON e.id_examen = pe.id_examen
         JOIN modules m           ON m.id_module = e.id_module
@@ -307,47 +309,119 @@ def create_periode():
 
 @app.post("/api/periodes/<int:pid>/generate_planning")
 def generate_planning(pid: int):
-    # Run generate_assign.py with correct path resolution
-    start = time.time()
-    
-    # Get the absolute path to generate_assign.py (one level up from api/)
-    script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    script_path = os.path.join(script_dir, "generate_assign.py")
-    
-    if not os.path.exists(script_path):
-        return fail(f"Script not found at {script_path}", 500)
-    
+    # Queue the generation as a background job (see generation_jobs.py)
+    body = request.get_json(silent=True) or {}
+    options = dict(
+        audit=bool(body.get("audit", False)),
+        dry_run=bool(body.get("dry_run", False)),
+        parallel=bool(body.get("parallel", False)),
+        improve_seconds=float(body.get("improve_seconds", 0)),
+        slot_engine=body.get("slot_engine", "waves"),
+        starts=int(body.get("starts", 1)),
+        seed=int(body.get("seed", 0)),
+        force=bool(body.get("force", False)),
+    )
     try:
-        result = subprocess.run(
-            [sys.executable, script_path, str(pid)],
-            capture_output=True,
-            text=True,
-            timeout=300
-        )
-        elapsed = time.time() - start
-
-        if result.returncode != 0:
-            return fail(result.stderr or "Generation failed", 500)
-
-        # Update generation time in database
-        conn = get_conn()
+        job = submit_generation(pid, **options)
+    except ValueError as e:
+        return fail(str(e), 409)
+    return ok(job.to_dict(), status_url=f"/api/jobs/{job.id}"), 202
+
+@app.post("/api/periodes/<int:pid>/update_planning")
+def update_planning(pid: int):
+    # Repair the existing plan in a background job (ExamScheduler.update)
+    body = request.get_json(silent=True) or {}
+    options = dict(
+        incremental=True,
+        dry_run=bool(body.get("dry_run", False)),
+        closed_rooms=[int(r) for r in body.get("closed_rooms", [])],
+        unavailable_profs=[int(p) for p in body.get("unavailable_profs", [])],
+    )
+    try:
+        job = submit_generation(pid, **options)
+    except ValueError as e:
+        return fail(str(e), 409)
+    return ok(job.to_dict(), status_url=f"/api/jobs/{job.id}"), 202
+
+@app.get("/api/periodes/<int:pid>/generation/stream")
+def generation_stream(pid: int):
+    """
+    Server-Sent Events stream of the period's generation progress
+    (job state, phases, waves). Closes once the job has finished.
+
+    ?job_id=<id> follows that job only; otherwise the events of every job
+    of the period are sent, each tagged with its job_id.
+    """
+    job_id = request.args.get("job_id")
+
+    def events():
+        q = progress_channel.subscribe(pid)
         try:
-            cur = conn.cursor()
-            cur.execute("""
-                UPDATE periodes_examens 
-                SET generation_time_seconds = %s,
-                    generation_completed_at = NOW()
-                WHERE id_periode = %s
-            """, (round(elapsed, 2), pid))
-            conn.commit()
+            while True:
+                try:
+                    event = q.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if job_id and event.get("job_id") != job_id:
+                    continue
+                yield f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+                if is_terminal(event):
+                    break
         finally:
-            conn.close()
+            progress_channel.unsubscribe(pid, q)
 
-        return ok({"period_id": pid, "elapsed_seconds": round(elapsed, 2), "logs": result.stdout})
-    except subprocess.TimeoutExpired:
-        return fail("Generation script timed out (max 5 minutes)", 500)
-    except Exception as e:
-        return fail(f"Generation error: {str(e)}", 500)
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/jobs/<job_id>")
+def job_status(job_id: str):
+    job = get_job(job_id)
+    if not job:
+        return fail("Unknown job id", 404)
+    return ok(job.to_dict())
+
+@app.get("/api/periodes/<int:pid>/generation_stats")
+def generation_stats(pid: int):
+    """Per-phase timings of the period's latest generations (newest first)"""
+    limit = request.args.get("limit", default=10, type=int)
+    df = query_df("""
+        SELECT
+            r.id_run,
+            r.started_at,
+            r.total_seconds,
+            r.exams_placed,
+            r.exams_skipped,
+            s.phase,
+            s.seconds,
+            s.calls
+        FROM (
+            SELECT *
+            FROM generation_runs
+            WHERE id_periode = %s
+            ORDER BY started_at DESC
+            LIMIT %s
+        ) r
+        JOIN generation_phase_stats s ON s.id_run = r.id_run
+        ORDER BY r.started_at DESC, s.seconds DESC
+    """, params=[pid, limit])
+
+    runs = {}
+    for r in df.to_dict(orient="records"):
+        run = runs.setdefault(r["id_run"], {
+            "id_run": int(r["id_run"]),
+            "started_at": str(r["started_at"]),
+            "total_seconds": float(r["total_seconds"]),
+            "exams_placed": int(r["exams_placed"]),
+            "exams_skipped": int(r["exams_skipped"]),
+            "phases": {}
+        })
+        run["phases"][r["phase"]] = {"seconds": float(r["seconds"]), "calls": int(r["calls"])}
+
+    return ok(list(runs.values()))
 
 @app.delete("/api/periodes/<int:pid>/planning")
 def delete_planning(pid: int):
@@ -361,6 +435,34 @@ def delete_planning(pid: int):
     finally:
         conn.close()
 
+@app.get("/api/periodes/<int:pid>/planning/versions")
+def planning_versions(pid: int):
+    conn = get_conn()
+    try:
+        versions = plan_versions.list_versions(conn, pid)
+    finally:
+        conn.close()
+    for v in versions:
+        v["created_at"] = str(v["created_at"])
+        v["activated_at"] = str(v["activated_at"]) if v["activated_at"] else None
+    return ok(versions)
+
+@app.post("/api/periodes/<int:pid>/planning/rollback")
+def rollback_planning(pid: int):
+    # Switch the period back to a retained plan version (plan_versions.py)
+    body = request.get_json(silent=True) or {}
+    version = body.get("version")
+    conn = get_conn()
+    try:
+        active = plan_versions.rollback(conn, pid, int(version) if version is not None else None)
+        conn.commit()
+        return ok({"id_periode": pid, "active_version": active})
+    except ValueError as e:
+        conn.rollback()
+        return fail(str(e), 404)
+    finally:
+        conn.close()
+
 @app.get("/api/periodes/<int:pid>/preview")
 def preview(pid: int):
     limit = request.args.get("limit", default=100, type=int)
@@ -371,7 +473,7 @@ def preview(pid: int):
             TO_CHAR(c.heure_fin, 'HH24:MI') AS End,
             m.nom AS Module,
             le.nom AS Room
-        FROM planning_examens pe
+        FROM planning_examens_actifs pe
         JOIN examens e       ON e.id_examen = pe.id_examen
         JOIN modules m       ON m.id_module = e.id_module
         JOIN creneaux c      ON c.id_creneau = pe.id_creneau
@@ -390,7 +492,7 @@ def room_conflicts(pid: int):
             c.date,
             TO_CHAR(c.heure_debut, 'HH24:MI') AS Start,
             COUNT(*) AS Exams
-        FROM planning_examens pe
+        FROM planning_examens_actifs pe
         JOIN lieux_examen le ON le.id_lieu = pe.id_lieu
         JOIN creneaux c      ON c.id_creneau = pe.id_creneau
         WHERE c.id_periode = %s
@@ -426,7 +528,7 @@ def student_schedule():
         FROM etudiants et
         JOIN groupes g ON g.id_groupe = et.id_groupe
         JOIN planning_groupes pg ON pg.id_groupe = g.id_groupe
-        JOIN planning_examens pe ON pe.id_planning = pg.id_planning
+        JOIN planning_examens_actifs pe ON pe.id_planning = pg.id_planning
         JOIN examens e ON e.id_examen = pe.id_examen
         JOIN modules m ON m.id_module = e.id_module
         JOIN creneaux c ON c.id_creneau = pe.id_creneau
@@ -455,7 +557,7 @@ def dash_kpis():
     if periode_id:
         total_planned = query_df("""
             SELECT COUNT(DISTINCT pe.id_planning) AS n
-            FROM planning_examens pe
+            FROM planning_examens_actifs pe
             JOIN creneaux c ON pe.id_creneau = c.id_creneau
             WHERE (%s IS NULL OR c.id_periode = %s)
         """, params=[periode_id, periode_id]).iloc[0]["n"]
@@ -471,7 +573,7 @@ def dash_kpis():
         merged_count = query_df("""
             SELECT COUNT(DISTINCT pg.id_planning) AS n
             FROM planning_groupes pg
-            JOIN planning_examens pe ON pe.id_planning = pg.id_planning
+            JOIN planning_examens_actifs pe ON pe.id_planning = pg.id_planning
             JOIN creneaux c ON pe.id_creneau = c.id_creneau
             WHERE pg.merged_groups IS NOT NULL
             AND (%s IS NULL OR c.id_periode = %s)
@@ -480,16 +582,26 @@ def dash_kpis():
         split_count = query_df("""
             SELECT COUNT(DISTINCT pg.id_planning) AS n
             FROM planning_groupes pg
-            JOIN planning_examens pe ON pe.id_planning = pg.id_planning
+            JOIN planning_examens_actifs pe ON pe.id_planning = pg.id_planning
             JOIN creneaux c ON pe.id_creneau = c.id_creneau
             WHERE pg.split_part IS NOT NULL
             AND (%s IS NULL OR c.id_periode = %s)
         """, params=[periode_id, periode_id]).iloc[0]["n"]
 
     else:
-        total_planned = query_df("SELECT COUNT(*) as n FROM planning_examens").iloc[0]["n"]
-        merged_count = query_df("SELECT COUNT(DISTINCT id_planning) as n FROM planning_groupes WHERE merged_groups IS NOT NULL").iloc[0]["n"]
-        split_count = query_df("SELECT COUNT(DISTINCT id_groupe) as n FROM planning_groupes WHERE split_part IS NOT NULL").iloc[0]["n"]
+        total_planned = query_df("SELECT COUNT(*) as n FROM planning_examens_actifs").iloc[0]["n"]
+        merged_count = query_df("""
+            SELECT COUNT(DISTINCT pg.id_planning) as n
+            FROM planning_groupes pg
+            JOIN planning_examens_actifs pe ON pe.id_planning = pg.id_planning
+            WHERE pg.merged_groups IS NOT NULL
+        """).iloc[0]["n"]
+        split_count = query_df("""
+            SELECT COUNT(DISTINCT pg.id_groupe) as n
+            FROM planning_groupes pg
+            JOIN planning_examens_actifs pe ON pe.id_planning = pg.id_planning
+            WHERE pg.split_part IS NOT NULL
+        """).iloc[0]["n"]
 
     total_profs = query_df("SELECT COUNT(*) as n FROM professeurs").iloc[0]["n"]
     total_students = query_df("SELECT COUNT(*) as n FROM etudiants").iloc[0]["n"]
@@ -509,7 +621,7 @@ def dash_room_dist():
         df = query_df("""
             SELECT l.type, COUNT(pe.id_planning) as usage_count
             FROM lieux_examen l
-            LEFT JOIN planning_examens pe ON l.id_lieu = pe.id_lieu
+            LEFT JOIN planning_examens_actifs pe ON l.id_lieu = pe.id_lieu
             LEFT JOIN creneaux c ON pe.id_creneau = c.id_creneau
             WHERE c.id_periode = %s
             GROUP BY l.type
@@ -518,7 +630,7 @@ def dash_room_dist():
         df = query_df("""
             SELECT l.type, COUNT(pe.id_planning) as usage_count
             FROM lieux_examen l
-            LEFT JOIN planning_examens pe ON l.id_lieu = pe.id_lieu
+            LEFT JOIN planning_examens_actifs pe ON l.id_lieu = pe.id_lieu
             GROUP BY l.type
         """)
     return ok(df.to_dict(orient="records"))
@@ -530,7 +642,7 @@ def dash_top_rooms():
         df = query_df("""
             SELECT l.nom, l.type, COUNT(pe.id_planning) as sessions
             FROM lieux_examen l
-            JOIN planning_examens pe ON l.id_lieu = pe.id_lieu
+            JOIN planning_examens_actifs pe ON l.id_lieu = pe.id_lieu
             JOIN creneaux c ON pe.id_creneau = c.id_creneau
             WHERE c.id_periode = %s
             GROUP BY l.nom, l.type
@@ -540,7 +652,7 @@ def dash_top_rooms():
         df = query_df("""
             SELECT l.nom, l.type, COUNT(pe.id_planning) as sessions
             FROM lieux_examen l
-            JOIN planning_examens pe ON l.id_lieu = pe.id_lieu
+            JOIN planning_examens_actifs pe ON l.id_lieu = pe.id_lieu
             GROUP BY l.nom, l.type
             ORDER BY sessions DESC
         """)
@@ -555,7 +667,7 @@ def dash_prof_load():
             FROM professeurs p
             JOIN departements d ON p.id_dept = d.id_dept
             LEFT JOIN surveillances s ON p.id_prof = s.id_prof
-            LEFT JOIN planning_examens pe ON s.id_planning = pe.id_planning
+            LEFT JOIN planning_examens_actifs pe ON s.id_planning = pe.id_planning
             LEFT JOIN creneaux c ON pe.id_creneau = c.id_creneau
             WHERE c.id_periode = %s
             GROUP BY p.nom, d.nom
@@ -566,7 +678,10 @@ def dash_prof_load():
             SELECT p.nom, d.nom as Dept, COUNT(s.id_planning) as total_surveillances
             FROM professeurs p
             JOIN departements d ON p.id_dept = d.id_dept
-            LEFT JOIN surveillances s ON p.id_prof = s.id_prof
+            LEFT JOIN (
+                surveillances s
+                JOIN planning_examens_actifs pe ON pe.id_planning = s.id_planning
+            ) ON p.id_prof = s.id_prof
             GROUP BY p.nom, d.nom
             ORDER BY total_surveillances DESC
         """)
@@ -588,7 +703,7 @@ def dash_prof_conflicts():
             ) AS Details
         FROM surveillances s
         JOIN professeurs p ON p.id_prof = s.id_prof
-        JOIN planning_examens pe ON pe.id_planning = s.id_planning
+        JOIN planning_examens_actifs pe ON pe.id_planning = s.id_planning
         JOIN examens e ON e.id_examen = pe.id_examen
         JOIN modules m ON m.id_module = e.id_module
         JOIN lieux_examen le ON le.id_lieu = pe.id_lieu
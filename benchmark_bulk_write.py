@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Bulk Write Benchmark for Generated Plans
+========================================
+
+Compares the two plan writers of bulk_writer.py (execute_values vs COPY)
+on planning_examens, surveillances and planning_groupes at 1x, 10x and 50x
+today's data volume. Rows go into TEMP copies of the three tables, so the
+real planning is never touched.
+
+Usage:
+    python benchmark_bulk_write.py [period_id]
+"""
+
+import sys
+import time
+import json
+import statistics
+from datetime import datetime
+
+from db import get_conn
+from bulk_writer import WRITERS
+
+
+SCALES = [1, 10, 50]
+ITERATIONS = 3
+
+# Volume of a full generation on the bundled dataset, used when the
+# database holds no planning to measure
+DEFAULT_VOLUME = {
+    "planning_examens": 4630,
+    "surveillances": 11316,
+    "planning_groupes": 6686,
+}
+
+TABLES = {
+    "planning_examens": ("id_planning", "id_examen", "id_creneau", "id_lieu"),
+    "surveillances": ("id_prof", "id_planning"),
+    "planning_groupes": ("id_planning", "id_groupe", "split_part", "merged_groups"),
+}
+
+
+def current_volume(cursor, period_id=None):
+    """Row counts of the current planning (for one period if given)"""
+    if period_id:
+        cursor.execute("""
+            SELECT
+                (SELECT COUNT(*) FROM planning_examens pe
+                 JOIN creneaux c ON c.id_creneau = pe.id_creneau
+                 WHERE c.id_periode = %s),
+                (SELECT COUNT(*) FROM surveillances s
+                 JOIN planning_examens pe ON pe.id_planning = s.id_planning
+                 JOIN creneaux c ON c.id_creneau = pe.id_creneau
+                 WHERE c.id_periode = %s),
+                (SELECT COUNT(*) FROM planning_groupes pg
+                 JOIN planning_examens pe ON pe.id_planning = pg.id_planning
+                 JOIN creneaux c ON c.id_creneau = pe.id_creneau
+                 WHERE c.id_periode = %s)
+        """, (period_id, period_id, period_id))
+    else:
+        cursor.execute("""
+            SELECT
+                (SELECT COUNT(*) FROM planning_examens),
+                (SELECT COUNT(*) FROM surveillances),
+                (SELECT COUNT(*) FROM planning_groupes)
+        """)
+    counts = cursor.fetchone()
+    if not counts[0]:
+        return dict(DEFAULT_VOLUME)
+    return dict(zip(TABLES, counts))
+
+
+def synthetic_rows(volume, scale):
+    """Plan-shaped rows (ids only need to be unique where keys require it)"""
+    n_plan = volume["planning_examens"] * scale
+    n_surv = volume["surveillances"] * scale
+    n_grp = volume["planning_groupes"] * scale
+
+    planning = [(i + 1, i % 1300 + 1, i % 88 + 1, i % 65 + 1) for i in range(n_plan)]
+    surveillances = [(i % 240 + 1, i // 3 % n_plan + 1) for i in range(n_surv)]
+    groupes = []
+    for i in range(n_grp):
+        if i % 3 == 0:
+            groupes.append((i % n_plan + 1, i + 1, "A", None))
+        else:
+            groupes.append((i % n_plan + 1, i + 1, None, "G01+G02"))
+
+    return {
+        "planning_examens": planning,
+        "surveillances": surveillances,
+        "planning_groupes": groupes,
+    }
+
+
+def create_temp_tables(cursor):
+    """TEMP copies (columns, defaults, indexes) without foreign keys"""
+    for table in TABLES:
+        cursor.execute(f"""
+            CREATE TEMP TABLE bench_{table}
+            (LIKE {table} INCLUDING DEFAULTS INCLUDING INDEXES)
+        """)
+    # split_part is written as a letter by the scheduler
+    cursor.execute("ALTER TABLE bench_planning_groupes ALTER COLUMN split_part TYPE VARCHAR(2)")
+
+
+def time_writer(conn, writer, rows):
+    """Median wall time (ms) to write all three tables and commit"""
+    cursor = conn.cursor()
+    timings = []
+
+    for _ in range(ITERATIONS):
+        cursor.execute("TRUNCATE " + ", ".join(f"bench_{t}" for t in TABLES))
+        conn.commit()
+
+        start = time.perf_counter()
+        for table, columns in TABLES.items():
+            writer(cursor, f"bench_{table}", columns, rows[table])
+        conn.commit()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    cursor.close()
+    return {
+        "median_ms": statistics.median(timings),
+        "min_ms": min(timings),
+        "max_ms": max(timings),
+    }
+
+
+def run(period_id=None):
+    conn = get_conn()
+    cursor = conn.cursor()
+
+    try:
+        volume = current_volume(cursor, period_id)
+        create_temp_tables(cursor)
+        conn.commit()
+
+        print("=" * 70)
+        print("PLAN BULK WRITE BENCHMARK (execute_values vs COPY)")
+        print("=" * 70)
+        print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"Base volume: {volume}")
+        print("=" * 70)
+
+        results = {}
+        for scale in SCALES:
+            rows = synthetic_rows(volume, scale)
+            total = sum(len(r) for r in rows.values())
+            results[f"{scale}x"] = {"rows": total}
+
+            for name, writer in WRITERS.items():
+                timing = time_writer(conn, writer, rows)
+                results[f"{scale}x"][name] = timing
+                print(f"  {scale:3d}x │ {name:7s} │ Rows: {total:8d} │ "
+                      f"Median: {timing['median_ms']:9.1f}ms │ "
+                      f"Min: {timing['min_ms']:9.1f}ms │ "
+                      f"Max: {timing['max_ms']:9.1f}ms")
+
+            speedup = results[f"{scale}x"]["values"]["median_ms"] / results[f"{scale}x"]["copy"]["median_ms"]
+            results[f"{scale}x"]["copy_speedup"] = round(speedup, 2)
+            print(f"  {scale:3d}x │ COPY speedup: {speedup:.2f}x")
+            print(f"{'─' * 70}")
+
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "base_volume": volume,
+            "iterations": ITERATIONS,
+            "results": results,
+        }
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    period_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    results = run(period_id)
+
+    filename = f"benchmark_bulk_write_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(filename, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to: {filename}")
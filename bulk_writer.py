@@ -0,0 +1,54 @@
+"""
+Bulk writers for generated plans.
+
+Both writers take a cursor, a table name, its column list and an iterable
+of row tuples, so the scheduler and the benchmark can switch between them.
+"""
+import csv
+import io
+
+from psycopg2.extras import execute_values
+
+
+def insert_values(cursor, table, columns, rows):
+    """
+    Write rows with a single multi-row INSERT built by execute_values.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    execute_values(
+        cursor,
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s",
+        rows,
+        page_size=len(rows)
+    )
+    return len(rows)
+
+
+def copy_rows(cursor, table, columns, rows):
+    """
+    Stream rows through COPY ... FROM STDIN (CSV) from an in-memory buffer.
+    None is written as an unquoted empty field, which COPY reads as NULL.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    if not count:
+        return 0
+
+    buf.seek(0)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+        buf
+    )
+    return count
+
+
+WRITERS = {
+    "values": insert_values,
+    "copy": copy_rows,
+}
@@ -0,0 +1,117 @@
+"""
+Exam conflict graph built from student enrolments.
+
+Two exams conflict when at least one student is enrolled in both
+modules, so they must not be held on the same day. The graph is kept as
+a CSR adjacency (indptr, indices) in NumPy arrays: the neighbours of
+exam i are indices[indptr[i]:indptr[i + 1]].
+
+Used by the DSatur slot engine of generate_assign.py (slot_engine="dsatur").
+"""
+import heapq
+
+import numpy as np
+
+
+def build_conflict_graph(exam_of, student_of, n_exams):
+    """
+    CSR adjacency of the conflict graph from enrolment pairs: exam_of[k]
+    (exam index, 0..n_exams-1) is taken by student_of[k] (any int id).
+    """
+    exam_of = np.asarray(exam_of, dtype=np.int64)
+    student_of = np.asarray(student_of, dtype=np.int64)
+
+    # One row per (student, exam), grouped by student
+    pairs = np.unique(np.stack((student_of, exam_of), axis=1), axis=0)
+    students, starts, sizes = np.unique(pairs[:, 0], return_index=True, return_counts=True)
+    exams = pairs[:, 1]
+
+    # Every pair of exams of one student is an edge. Students with the
+    # same number of exams are handled together as a (students x k) block.
+    src_parts = []
+    dst_parts = []
+    for k in np.unique(sizes):
+        if k < 2:
+            continue
+        block_starts = starts[sizes == k]
+        block = exams[block_starts[:, None] + np.arange(k)]
+        a, b = np.triu_indices(k, 1)
+        src_parts.append(block[:, a].ravel())
+        dst_parts.append(block[:, b].ravel())
+
+    if src_parts:
+        src = np.concatenate(src_parts + dst_parts)
+        dst = np.concatenate(dst_parts + src_parts)
+        keys = np.unique(src * n_exams + dst)
+        src, dst = keys // n_exams, keys % n_exams
+    else:
+        src = dst = np.zeros(0, dtype=np.int64)
+
+    indptr = np.zeros(n_exams + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n_exams), out=indptr[1:])
+    return indptr, dst.astype(np.int32)
+
+
+def exam_conflict_graph(exam_ids, enrolled_exams, enrolled_students):
+    """
+    Conflict graph over exams in exam_ids order, from enrolments given as
+    two parallel id arrays (id_examen, id_etudiant). Enrolments of other
+    exams are ignored.
+    """
+    exam_ids = np.asarray(exam_ids, dtype=np.int64)
+    enrolled_exams = np.asarray(enrolled_exams, dtype=np.int64)
+    enrolled_students = np.asarray(enrolled_students, dtype=np.int64)
+    keep = np.isin(enrolled_exams, exam_ids)
+    order = np.argsort(exam_ids)
+    exam_of = order[np.searchsorted(exam_ids[order], enrolled_exams[keep])]
+    return build_conflict_graph(exam_of, enrolled_students[keep], len(exam_ids))
+
+
+def neighbours(graph, i):
+    indptr, indices = graph
+    return indices[indptr[i]:indptr[i + 1]]
+
+
+class DSaturOrder:
+    """
+    DSatur vertex order: next is always the uncoloured exam whose
+    neighbours already use the most distinct colours (days), ties broken
+    by degree. Colours are reported back with color(); a vertex that
+    could not be coloured is simply dropped by calling color(i, None).
+    """
+
+    def __init__(self, graph, n_colors, candidates):
+        indptr, _ = graph
+        self.graph = graph
+        self.degree = np.diff(indptr)
+        # Exam x colour matrix: True when a neighbour already has the colour
+        self.seen = np.zeros((len(self.degree), n_colors), dtype=bool)
+        self.saturation = np.zeros(len(self.degree), dtype=np.int64)
+        self.pending = set(int(i) for i in candidates)
+        # Lazy max-heap of (-saturation, -degree, index)
+        self.heap = [(0, -int(self.degree[i]), i) for i in self.pending]
+        heapq.heapify(self.heap)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while self.heap:
+            sat, _, i = heapq.heappop(self.heap)
+            if i in self.pending and -sat == self.saturation[i]:
+                return i
+        raise StopIteration
+
+    def color(self, i, color):
+        self.pending.discard(i)
+        if color is None:
+            return
+
+        nbrs = neighbours(self.graph, i)
+        new = nbrs[~self.seen[nbrs, color]]
+        self.seen[new, color] = True
+        self.saturation[new] += 1
+        for j in new:
+            j = int(j)
+            if j in self.pending:
+                heapq.heappush(self.heap, (-int(self.saturation[j]), -int(self.degree[j]), j))
@@ -56,10 +56,18 @@ export const api = {
   periodes: () => request("/periodes"),
   createPeriode: (date_debut, date_fin, description) =>
     request("/periodes", { method: "POST", body: { date_debut, date_fin, description } }),
-  generatePlanning: (pid) => 
-    request(`/periodes/${pid}/generate_planning`, { method: "POST" }),
+  generatePlanning: (pid, options = {}) => 
+    request(`/periodes/${pid}/generate_planning`, { method: "POST", body: options }),
+  updatePlanning: (pid, options = {}) =>
+    request(`/periodes/${pid}/update_planning`, { method: "POST", body: options }),
+  job: (job_id) => 
+    request(`/jobs/${job_id}`),
   deletePlanning: (pid) => 
     request(`/periodes/${pid}/planning`, { method: "DELETE" }),
+  planningVersions: (pid) =>
+    request(`/periodes/${pid}/planning/versions`),
+  rollbackPlanning: (pid, version) =>
+    request(`/periodes/${pid}/planning/rollback`, { method: "POST", body: { version } }),
   previewPlanning: (pid, limit = 100) => 
     request(`/periodes/${pid}/preview`, { params: { limit } }),
   roomConflicts: (pid) => 
@@ -1,4 +1,5 @@
 import { api } from "./api.js";
+import { API_URL } from "./config.js";
 const $ = (id)=>document.getElementById(id);
 
 const msg = $("msg");
@@ -22,6 +23,7 @@ function rowHTML(p){
       <td style="display:flex; gap:8px; flex-wrap:wrap;">
         <button class="btn small" data-act="preview" data-id="${p.id_periode}">Preview</button>
         <button class="btn small" data-act="conflicts" data-id="${p.id_periode}">Conflicts</button>
+        <button class="btn small" data-act="dryrun" data-id="${p.id_periode}">Dry run</button>
         <button class="btn small primary" data-act="generate" data-id="${p.id_periode}">Generate</button>
         <button class="btn small danger" data-act="delete" data-id="${p.id_periode}">Delete planning</button>
       </td>
@@ -58,6 +60,59 @@ $("create").addEventListener("click", async ()=>{
 
 $("refresh").addEventListener("click", refresh);
 
+const sleep = (ms)=>new Promise(r=>setTimeout(r,ms));
+const isActive = (job)=>job.state === "queued" || job.state === "running";
+
+function progressText(job){
+  const p = job.progress || {};
+  const wave = p.wave ? ` — wave ${p.wave}/${p.total_waves}` : "";
+  const counts = p.placed !== undefined ? `, ${p.placed} placed, ${p.skipped} skipped` : "";
+  return `Generating planning for period ${job.period_id} (${job.state}${wave}${counts})…`;
+}
+
+// Follow the generation live (Server-Sent Events) until the job finishes.
+// Other jobs of the period (e.g. a dry run) share the channel: their
+// events are ignored.
+function streamJob(job){
+  return new Promise((resolve, reject)=>{
+    const id = job.job_id;
+    const src = new EventSource(`${API_URL}/api/periodes/${job.period_id}/generation/stream?job_id=${id}`);
+    const ours = (ev)=>{
+      const e = JSON.parse(ev.data);
+      return e.job_id === id ? e : null;
+    };
+    src.addEventListener("job", (ev)=>{
+      const e = ours(ev);
+      if(!e) return;
+      job = e;
+      if(!isActive(job)){ src.close(); resolve(job); }
+    });
+    src.addEventListener("phase", (ev)=>{
+      const e = ours(ev);
+      if(e && e.status === "started") setMsg(`Generating planning for period ${job.period_id} (${e.phase})…`);
+    });
+    src.addEventListener("wave", (ev)=>{
+      const e = ours(ev);
+      if(e) setMsg(progressText({ ...job, state: "running", progress: e }));
+    });
+    src.onerror = ()=>{ src.close(); reject(new Error("stream closed")); };
+  });
+}
+
+// Wait for a background generation job, polling if streaming is unavailable
+async function waitForJob(job){
+  if(isActive(job) && window.EventSource){
+    try{ job = await streamJob(job); }catch(e){ /* fall back to polling */ }
+  }
+  while(isActive(job)){
+    setMsg(progressText(job));
+    await sleep(1000);
+    job = await api.job(job.job_id);
+  }
+  if(job.state === "failed") throw new Error(job.error || "Generation failed");
+  return job;
+}
+
 rowsEl.addEventListener("click", async (ev)=>{
   const btn = ev.target.closest("button");
   if(!btn) return;
@@ -67,9 +122,18 @@ rowsEl.addEventListener("click", async (ev)=>{
   try{
     if(act === "generate"){
       setMsg(`Generating planning for period ${id}… (may take time)`);
-      const r = await api.generatePlanning(id);
-      console.log("Generate logs:", r.logs);
-      setMsg(`Generated ✅ in ${r.elapsed_seconds}s`);
+      const job = await waitForJob(await api.generatePlanning(id));
+      console.table(job.result.stats?.phases);
+      setMsg(`Generated ✅ in ${job.result.elapsed_seconds}s`);
+    }
+    if(act === "dryrun"){
+      setMsg(`Dry run for period ${id}…`);
+      const job = await waitForJob(await api.generatePlanning(id, { dry_run: true }));
+      const m = job.result.metrics;
+      console.table(job.result.plan);
+      console.table(job.result.skipped);
+      setMsg(`Dry run ✅ ${m.exams_placed} exams placed, ${m.exams_skipped} skipped, `
+        + `${m.days_used} days, prof load ${m.prof_load_min}–${m.prof_load_max} (check console)`);
     }
     if(act === "delete"){
       setMsg(`Deleting planning for period ${id}…`);
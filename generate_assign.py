@@ -1,269 +1,748 @@
+import os
+import hashlib
 import sys
-from collections import defaultdict
-from datetime import datetime
-from psycopg2.extras import RealDictCursor, execute_values
+import json
+import time
+import heapq
+import random
+import multiprocessing
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
+from datetime import date, time as dt_time
+import numpy as np
+import psycopg2
+from psycopg2 import errors
+from psycopg2.extras import RealDictCursor
 
 # Import PostgreSQL connector and our centralized DB config
 from db import get_conn
+from bulk_writer import copy_rows
+import reference_cache
+import plan_versions
+from plan_improver import PlanImprover
+from conflict_graph import exam_conflict_graph, DSaturOrder
+from student_clash import StudentClashes
+
+# Maximum surveillances per professor and per day
+MAX_DAILY_SURVEILLANCES = 3
+
+# Extra cost of a supervisor from another department than the exam's, in
+# surveillances: below 1, so a less loaded professor still wins, but on
+# equal load the exam's own department does
+CROSS_DEPT_PENALTY = 0.5
+
+# Part of the input fingerprint: bump when a change to the scheduling
+# logic should make existing plans be regenerated
+ALGORITHM_VERSION = 5
+
+
+# --------------------------------------------------
+# PHASE TIMING
+# --------------------------------------------------
+def timed(name):
+    """
+    Accumulate the wall time and call count of a scheduler method
+    under `name` in the scheduler's phase stats.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.record_phase(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+# --------------------------------------------------
+# COMPACT RECORDS (SCHEDULER WORKING SET)
+# --------------------------------------------------
+class Record:
+    """
+    One loaded row as a fixed-attribute object (__slots__, no per-row
+    dict). idx is its position in the scheduler's list, which is also its
+    row in the occupancy matrices, so hot paths never look an id up.
+    """
+    __slots__ = ("idx",)
+    fields = ()
+
+    def __init__(self, idx, row):
+        self.idx = idx
+        for name in self.fields:
+            setattr(self, name, row[name])
+
+    def row(self):
+        """The database columns as a plain dict (e.g. for worker processes)"""
+        return {name: getattr(self, name) for name in self.fields}
+
+
+class Slot(Record):
+    fields = ("id_creneau", "date", "heure_debut")
+    # day: column in the x day matrices
+    __slots__ = fields + ("day", "date_str")
+
+
+class Room(Record):
+    fields = ("id_lieu", "capacite", "type")
+    __slots__ = fields
+
+
+class Group(Record):
+    fields = ("id_groupe", "id_formation", "annee", "effectif", "code_groupe")
+    __slots__ = fields
+
+
+class Exam(Record):
+    fields = ("id_examen", "id_module", "id_formation", "annee", "id_dept")
+    __slots__ = fields
+
+
+class Professor(Record):
+    fields = ("id_prof", "id_dept")
+    __slots__ = fields
+
+
+# One room's share of a cohort: groups is a tuple of Group, split_part
+# 'A', 'B'... for the parts of a group too large for any room, else None
+Pack = namedtuple("Pack", ("type", "groups", "capacity", "split_part"))
+
 
 # --------------------------------------------------
 # MAIN SCHEDULER
 # --------------------------------------------------
 class ExamScheduler:
 
-    def __init__(self, period_id: int):
+    def __init__(self, period_id: int, progress=None, audit=False, dry_run=False,
+                 parallel=False, workers=None, improve_seconds=0, slot_engine="waves",
+                 starts=1, seed=0, force=False, connect=True):
         self.period_id = period_id
-        self.conn = get_conn()
-        # ✅ TRANSACTION SAFETY: Disable autocommit for rollback capability
-        self.conn.autocommit = False
-        self.cursor = self.conn.cursor(cursor_factory=RealDictCursor)
-
-        # Global round-robin pointers
+        # Re-check the staged plan with SQL (verify_no_conflicts) before publishing it
+        self.audit = audit
+        # Build and verify the plan in memory only, never write it
+        self.dry_run = dry_run
+        # Schedule departments in worker processes (see schedule_parallel)
+        self.parallel = parallel
+        self.workers = workers
+        # Time budget of the local-search pass after the greedy one (0 = off)
+        self.improve_seconds = improve_seconds
+        # "waves": wave/round-robin by formation year, "dsatur": colouring
+        # of the student conflict graph (see conflict_graph.py)
+        if slot_engine not in ("waves", "dsatur"):
+            raise ValueError(f"Unknown slot engine: {slot_engine}")
+        if slot_engine == "dsatur" and parallel:
+            raise ValueError("The dsatur slot engine needs the whole conflict graph, "
+                             "it cannot run in parallel mode")
+        self.slot_engine = slot_engine
+        # Multi-start: number of seeded variants scheduled in worker
+        # processes, the best plan is kept (see schedule_multistart)
+        if starts > 1 and (parallel or slot_engine != "waves"):
+            raise ValueError("Multi-start needs the sequential waves engine")
+        self.starts = starts
+        self.seed = seed
+        # Randomizes wave, department and exam order when set (randomize())
+        self.rng = None
+        # Regenerate even when the period's plan was built from the same inputs
+        self.force = force
+        # Input fingerprint of this generation (see input_fingerprint)
+        self.fingerprint = None
+        # Optional callback receiving progress event dicts (e.g. a background job)
+        self.progress = progress
+        self.started_at = time.perf_counter()
+
+        # Per-phase accumulated seconds and call counts
+        self.phase_stats = defaultdict(lambda: {"seconds": 0.0, "calls": 0})
+
+        # Partition workers run without a database connection
+        self.conn = None
+        self.cursor = None
+        if connect:
+            self.conn = get_conn()
+            # ✅ TRANSACTION SAFETY: Disable autocommit for rollback capability
+            self.conn.autocommit = False
+            self.cursor = self.conn.cursor(cursor_factory=RealDictCursor)
+
+        # Global round-robin pointer over slots
         self.slot_ptr = 0
-        self.salle_ptr = 0
-        self.amphi_ptr = 0
+
+    def emit(self, event, **fields):
+        """
+        Send a structured progress event to the progress callback, if any.
+        """
+        if self.progress:
+            self.progress({
+                "event": event,
+                "period_id": self.period_id,
+                "elapsed": round(time.perf_counter() - self.started_at, 3),
+                **fields
+            })
+
+    def record_phase(self, name, seconds):
+        stats = self.phase_stats[name]
+        stats["seconds"] += seconds
+        stats["calls"] += 1
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time a named generation phase and emit started/finished events.
+        """
+        start = time.perf_counter()
+        self.emit("phase", phase=name, status="started")
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.record_phase(name, seconds)
+            self.emit("phase", phase=name, status="finished", seconds=round(seconds, 3))
+
+    def stats(self):
+        """
+        Timing summary of the generation so far: total seconds plus
+        seconds and call count per phase.
+        """
+        return {
+            "total_seconds": round(time.perf_counter() - self.started_at, 4),
+            "phases": {
+                name: {"seconds": round(v["seconds"], 4), "calls": v["calls"]}
+                for name, v in self.phase_stats.items()
+            }
+        }
 
     # --------------------------------------------------
     # LOAD DATA
     # --------------------------------------------------
     def load_data(self):
+        data = self.fetch_data()
+        self.fingerprint = self.input_fingerprint(data)
+        self.prepare(data)
 
-        # ---- Slots (exclude Friday)
-        self.cursor.execute("""
-            SELECT id_creneau, date, heure_debut
-            FROM creneaux
-            WHERE id_periode = %s
-            ORDER BY date, heure_debut
-        """, (self.period_id,))
-        
-        all_slots = self.cursor.fetchall()
-        
-        # Filter out Fridays (weekday 4)
+    def input_fingerprint(self, data):
+        """
+        SHA-256 of everything the plan depends on: the rows of fetch_data()
+        (slots, rooms, groups, exams, professors, enrolments) and the
+        algorithm version and options. Same fingerprint, same plan.
+
+        Rows and enrolment pairs are hashed sorted, so the fingerprint
+        does not depend on the order they were read in.
+        """
+        def canonical(rows):
+            return sorted(json.dumps(r, sort_keys=True, default=str) for r in rows)
+
+        h = hashlib.sha256()
+        h.update(json.dumps({
+            "algorithm": ALGORITHM_VERSION,
+            "max_daily": MAX_DAILY_SURVEILLANCES,
+            "parallel": self.parallel,
+            "improve_seconds": self.improve_seconds,
+            "slot_engine": self.slot_engine,
+            "starts": self.starts,
+            "seed": self.seed,
+            "data": {k: canonical(v) for k, v in data.items() if k != "enrolments"},
+        }, sort_keys=True).encode())
+        if data.get("enrolments") is not None:
+            exams, students = data["enrolments"]
+            order = np.lexsort((students, exams))
+            h.update(exams[order].tobytes())
+            h.update(students[order].tobytes())
+        return h.hexdigest()
+
+    def current_plan(self):
+        """
+        The period's active plan version if it was built from this
+        generation's inputs, or None.
+        """
+        try:
+            self.cursor.execute("""
+                SELECT v.id_version, v.exams_placed, v.exams_skipped
+                FROM periodes_examens p
+                JOIN plan_versions v ON v.id_version = p.active_version
+                WHERE p.id_periode = %s
+                AND v.input_fingerprint = %s
+            """, (self.period_id, self.fingerprint))
+        except (errors.UndefinedColumn, errors.UndefinedTable):
+            # Database without plan versions: always regenerate
+            self.conn.rollback()
+            return None
+        return self.cursor.fetchone()
+
+    def fetch_data(self):
+        """
+        Read every scheduling input in one round trip. Returns plain row
+        lists keyed by table, the input of prepare().
+
+        The statement also reports the database's reference data version
+        and only returns the parts whose copy in the process cache
+        (reference_cache.py) is stale, so a repeated generation on
+        unchanged data gets back a single integer.
+        """
+        parts = {
+            "slots": ("slots", self.period_id),
+            "reference": "reference",
+            "enrolments": "enrolments",
+        }
+        cached = {col: reference_cache.get(name) for col, name in parts.items()}
+
+        row = self.fetch_snapshot({col: v for col, (v, _) in cached.items()})
+        version = row["version"]
+
+        data = {}
+        hit = True
+        for col, name in parts.items():
+            if row[col] is None:
+                data[col] = cached[col][1]
+                continue
+            hit = False
+            data[col] = self.decode(col, row[col], data)
+            reference_cache.put(name, version, data[col])
+
+        if hit:
+            print(f"[INFO] Reference data unchanged (version {version}), loaded from cache")
+        data.update(data.pop("reference"))
+        return data
+
+    def fetch_snapshot(self, cached_versions):
+        """
+        Single statement returning the version and, as JSON aggregates,
+        each part whose cached version (cached_versions, None if not
+        cached) differs from it. Scalar subqueries inside CASE are only
+        run when their branch is taken.
+
+        Every aggregate is ordered down to the primary key: the order of
+        the rows decides ties in the scheduler (e.g. in the professor
+        heaps), so it must not follow the physical row order.
+        """
+        params = {"period_id": self.period_id}
+        for col in ("slots", "reference", "enrolments"):
+            # -1 never matches, so parts missing from the cache are loaded
+            v = cached_versions.get(col)
+            params[col] = -1 if v is None else v
+
+        sql = """
+            WITH v AS (SELECT {version} AS version)
+            SELECT
+                v.version,
+
+                CASE WHEN v.version IS DISTINCT FROM %(slots)s THEN (
+                    SELECT COALESCE(json_agg(json_build_object(
+                        'id_creneau', id_creneau, 'date', date, 'heure_debut', heure_debut
+                    ) ORDER BY date, heure_debut, id_creneau), '[]')
+                    FROM creneaux
+                    WHERE id_periode = %(period_id)s
+                ) END AS slots,
+
+                CASE WHEN v.version IS DISTINCT FROM %(reference)s THEN json_build_object(
+                    'rooms', (
+                        SELECT COALESCE(json_agg(json_build_object(
+                            'id_lieu', id_lieu, 'capacite', capacite, 'type', type
+                        ) ORDER BY capacite, id_lieu), '[]')
+                        FROM lieux_examen
+                    ),
+                    'departments', (
+                        SELECT COALESCE(json_agg(id_dept ORDER BY id_dept), '[]')
+                        FROM departements
+                    ),
+                    'formations', (
+                        SELECT COALESCE(json_agg(json_build_object(
+                            'id_formation', id_formation, 'id_dept', id_dept
+                        ) ORDER BY id_formation), '[]')
+                        FROM formations
+                    ),
+                    'groups', (
+                        SELECT COALESCE(json_agg(json_build_object(
+                            'id_groupe', id_groupe, 'id_formation', id_formation,
+                            'annee', annee, 'effectif', effectif, 'code_groupe', code_groupe
+                        ) ORDER BY id_formation, annee, code_groupe, id_groupe), '[]')
+                        FROM groupes
+                    ),
+                    'exams', (
+                        SELECT COALESCE(json_agg(json_build_object(
+                            'id_examen', e.id_examen, 'id_module', m.id_module,
+                            'id_formation', m.id_formation, 'annee', m.annee,
+                            'id_dept', f.id_dept
+                        ) ORDER BY m.id_formation, m.annee, m.id_module, e.id_examen), '[]')
+                        FROM examens e
+                        JOIN modules m ON m.id_module = e.id_module
+                        JOIN formations f ON f.id_formation = m.id_formation
+                    ),
+                    'professors', (
+                        SELECT COALESCE(json_agg(json_build_object(
+                            'id_prof', id_prof, 'id_dept', id_dept
+                        ) ORDER BY id_prof), '[]')
+                        FROM professeurs
+                    )
+                ) END AS reference,
+
+                -- Enrolments as two parallel id arrays (id_examen, id_etudiant),
+                -- in the same order
+                CASE WHEN v.version IS DISTINCT FROM %(enrolments)s THEN (
+                    SELECT json_build_array(
+                        COALESCE(json_agg(e.id_examen ORDER BY e.id_examen, i.id_etudiant), '[]'),
+                        COALESCE(json_agg(i.id_etudiant ORDER BY e.id_examen, i.id_etudiant), '[]')
+                    )
+                    FROM examens e
+                    JOIN inscriptions i ON i.id_module = e.id_module
+                ) END AS enrolments
+            FROM v
+        """
+        try:
+            self.cursor.execute(
+                sql.format(version="(SELECT version FROM reference_data_version WHERE id = 1)"),
+                params
+            )
+        except errors.UndefinedTable:
+            # No version table: nothing can be cached, load everything
+            self.conn.rollback()
+            self.cursor.execute(sql.format(version="NULL::BIGINT"), params)
+        return self.cursor.fetchone()
+
+    def decode(self, part, value, data):
+        """
+        Turn one JSON part of fetch_snapshot() into the rows prepare()
+        reads. JSON has no date/time types, so slot columns are parsed
+        back; the enrolment arrays become NumPy arrays.
+        """
+        if part == "slots":
+            for s in value:
+                s["date"] = date.fromisoformat(s["date"])
+                s["heure_debut"] = dt_time.fromisoformat(s["heure_debut"])
+        elif part == "enrolments":
+            value = tuple(np.asarray(ids, dtype=np.int64) for ids in value)
+        return value
+
+    def prepare(self, data):
+        """
+        Build the scheduler's working set from the row lists of
+        fetch_data() (or a partition of them): compact records, id -> index
+        maps for translating database ids, and empty occupancy state.
+        """
+        # ---- Slots (exclude Friday, weekday 4)
         self.slots = [
-            s for s in all_slots
-            if s["date"].weekday() != 4
+            Slot(i, s) for i, s in enumerate(
+                s for s in data["slots"] if s["date"].weekday() != 4
+            )
         ]
 
         if not self.slots:
             raise RuntimeError("No usable time slots found")
 
+        self.slot_idx = {s.id_creneau: s.idx for s in self.slots}
+
+        # ---- Days (columns of the group x day conflict matrix)
+        self.days = sorted({s.date for s in self.slots})
+        self.day_idx = {d: i for i, d in enumerate(self.days)}
+        for s in self.slots:
+            s.day = self.day_idx[s.date]
+            s.date_str = s.date.isoformat()
+        self.slot_day = np.array([s.day for s in self.slots], dtype=np.intp)
+
         # ---- Rooms
-        self.cursor.execute("""
-            SELECT id_lieu, capacite, type
-            FROM lieux_examen
-            ORDER BY capacite
-        """)
-        rooms = self.cursor.fetchall()
-        self.salles = [r for r in rooms if r["type"] == "salle"]
-        self.amphis = [r for r in rooms if r["type"] == "amphi"]
+        self.rooms = [Room(i, r) for i, r in enumerate(data["rooms"])]
+        self.room_idx = {r.id_lieu: r.idx for r in self.rooms}
+        self.salles = [r for r in self.rooms if r.type == "salle"]
+        self.amphis = [r for r in self.rooms if r.type == "amphi"]
+
+        # Capacity index per room type (ascending, for bisect) and the
+        # matching rows of the room x slot occupancy matrix
+        self.rooms_by_type = {"amphi": self.amphis, "salle": self.salles}
+        self.room_caps = {
+            t: [r.capacite for r in rs] for t, rs in self.rooms_by_type.items()
+        }
+        self.room_rows = {
+            t: np.array([r.idx for r in rs], dtype=np.intp)
+            for t, rs in self.rooms_by_type.items()
+        }
+
+        # Largest room of each type, and every room size (largest first):
+        # the pack size limits of create_packs. A partition (parallel mode)
+        # keeps the whole period's limits so its packs are the same as the
+        # main scheduler's.
+        self.max_room = data.get("max_room") or {
+            t: caps[-1] for t, caps in self.room_caps.items() if caps
+        }
+        self.pack_limits = data.get("pack_limits") or sorted(
+            {c for caps in self.room_caps.values() for c in caps}, reverse=True
+        )
+
+        # Room x slot matrix: True when the room is already booked in that slot
+        self.room_slot_busy = np.zeros((len(self.rooms), len(self.slots)), dtype=bool)
 
         # ---- Departments
-        self.cursor.execute("SELECT id_dept FROM departements ORDER BY id_dept")
-        self.departments = [d["id_dept"] for d in self.cursor.fetchall()]
+        self.departments = data["departments"]
 
         # ---- Formations by department
-        self.cursor.execute("""
-            SELECT id_formation, id_dept
-            FROM formations
-        """)
         self.formations_by_dept = defaultdict(list)
-        for f in self.cursor.fetchall():
+        for f in data["formations"]:
             self.formations_by_dept[f["id_dept"]].append(f["id_formation"])
 
         # ---- Groups
-        self.cursor.execute("""
-            SELECT id_groupe, id_formation, annee, effectif, code_groupe
-            FROM groupes
-            ORDER BY id_formation, annee, code_groupe
-        """)
-        self.groups = self.cursor.fetchall()
+        self.groups = [Group(i, g) for i, g in enumerate(data["groups"])]
+        self.group_idx = {g.id_groupe: g.idx for g in self.groups}
 
         self.groups_by_fy = defaultdict(list)
         for g in self.groups:
-            self.groups_by_fy[(g["id_formation"], g["annee"])].append(g)
+            self.groups_by_fy[(g.id_formation, g.annee)].append(g)
 
         # ---- Exams
-        self.cursor.execute("""
-            SELECT
-                e.id_examen,
-                m.id_module,
-                m.id_formation,
-                m.annee,
-                f.id_dept
-            FROM examens e
-            JOIN modules m ON m.id_module = e.id_module
-            JOIN formations f ON f.id_formation = m.id_formation
-            ORDER BY m.id_formation, m.annee, m.id_module
-        """)
-        self.exams = self.cursor.fetchall()
+        self.exams = [Exam(i, e) for i, e in enumerate(data["exams"])]
+        self.exam_idx = {e.id_examen: e.idx for e in self.exams}
+
+        # Day index of each placed exam (-1 while unplaced)
+        self.exam_day = np.full(len(self.exams), -1, dtype=np.intp)
+
+        # ---- Students: who sits which exam, as bitsets (student_clash.py).
+        # Every engine keeps students to one exam per day with it.
+        self.enrolments = data.get("enrolments")
+        self.clashes = None
+        if self.enrolments is not None:
+            self.clashes = StudentClashes(
+                [e.id_examen for e in self.exams], *self.enrolments, len(self.days)
+            )
+
+        # ---- Student conflict graph (CSR over exam idx), dsatur order only.
+        # Without enrolments it has no edges (plain order by degree 0).
+        self.conflicts = None
+        if self.slot_engine == "dsatur":
+            self.conflicts = exam_conflict_graph(
+                [e.id_examen for e in self.exams],
+                *(self.enrolments if self.enrolments is not None else ([], []))
+            )
+            print(f"[INFO] Conflict graph: {len(self.exams)} exams, "
+                  f"{len(self.conflicts[1]) // 2} conflicting pairs")
 
         # ---- Professors
-        self.cursor.execute("""
-            SELECT id_prof, id_dept
-            FROM professeurs
-        """)
-        self.professors = self.cursor.fetchall()
+        self.professors = [Professor(i, p) for i, p in enumerate(data["professors"])]
+        self.prof_idx = {p.id_prof: p.idx for p in self.professors}
 
         self.profs_by_dept = defaultdict(list)
         for p in self.professors:
-            self.profs_by_dept[p["id_dept"]].append(p)
+            self.profs_by_dept[p.id_dept].append(p)
 
-        # ---- Surveillance counters
-        self.prof_daily = defaultdict(lambda: defaultdict(int))
-        self.prof_total = defaultdict(int)
-        
-        # Track which professors are assigned to which time slots
-        # Format: prof_slot_assignments[prof_id][(date, time)] = exam_id
-        self.prof_slot_assignments = defaultdict(dict)
-        
-        # ✅ NEW: Cache for group conflicts (optimization)
-        self.group_exam_dates = defaultdict(set)
+        # ---- Surveillance counters (indexed by professor idx)
+        self.prof_total = [0] * len(self.professors)
+
+        # Professor x slot matrix: id_examen supervised in the slot, -1 when free
+        self.prof_slot = np.full((len(self.professors), len(self.slots)), -1, dtype=np.int64)
+
+        # Professor x day matrix: surveillances that day (MAX_DAILY_SURVEILLANCES cap)
+        self.prof_day = np.zeros((len(self.professors), len(self.days)), dtype=np.int16)
+
+        # Least-loaded-first heaps of (total, idx), global and per department
+        # (idx follows load order, so it also breaks ties). Entries are
+        # refreshed lazily: one whose total no longer matches prof_total is
+        # stale and dropped when it reaches the top.
+        self.global_heap = [(0, p.idx) for p in self.professors]
+        self.dept_heaps = defaultdict(list)
+        for p in self.professors:
+            self.dept_heaps[p.id_dept].append((0, p.idx))
+
+        # Group x day matrix: True when the group already has an exam that day
+        self.group_day_busy = np.zeros((len(self.groups), len(self.days)), dtype=bool)
+
+        # ---- Packs, once per cohort
+        self.plan_packs()
 
 
     # --------------------------------------------------
     # PACK CREATION (MERGE / SPLIT LOGIC)
     # --------------------------------------------------
-    def create_packs(self, groups, annee):
+    @timed("plan_packs")
+    def plan_packs(self):
         """
-        Licence logic:
-        - Merge (G01+G02), (G03+G04)
-        - Split last group (G05)
-        
-        Master logic (unchanged):
-        - Merge 2 groups
-        - Split last if odd
+        Pack every cohort (id_formation, annee) once, for each room size
+        in pack_limits: cohort_packings holds the distinct packings a
+        cohort can be seated with, largest rooms (fewest packs) first, and
+        cohort_packs the first of them. All the exams of a cohort share
+        these. Cohorts that can never be seated go to infeasible_cohorts
+        with the reason (of their largest-room packing).
+        """
+        self.cohort_packs = {}
+        self.cohort_packings = {}
+        self.infeasible_cohorts = {}
+        for fy, groups in self.groups_by_fy.items():
+            packings = []
+            reason = None
+            for limit in self.pack_limits:
+                packs = self.create_packs(groups, limit)
+                if packs in packings:
+                    continue
+                why = self.cohort_infeasibility(packs)
+                if why is None:
+                    packings.append(packs)
+                elif reason is None:
+                    reason = why
+            if not packings:
+                self.cohort_packs[fy] = self.create_packs(groups)
+                self.cohort_packings[fy] = ()
+                self.infeasible_cohorts[fy] = reason or self.cohort_infeasibility(())
+                continue
+            self.cohort_packs[fy] = packings[0]
+            self.cohort_packings[fy] = tuple(packings)
+
+    def cohort_infeasibility(self, packs):
+        """
+        Why a cohort's packs can never be held in one slot (None if they
+        can): each pack needs its own room of its type, the k-th largest
+        pack the k-th largest room at least, and its own supervisors.
+        """
+        if not packs:
+            return "no exam rooms"
+        for room_type, caps in self.room_caps.items():
+            needed = sorted((p.capacity for p in packs if p.type == room_type), reverse=True)
+            if len(needed) > len(caps):
+                return f"{len(needed)} {room_type} packs, {len(caps)} {room_type}s"
+            for size, cap in zip(needed, reversed(caps)):
+                if size > cap:
+                    return f"no {room_type} left for a pack of {size} seats"
+        supervisors = sum(self.required_surveillants(p.type) for p in packs)
+        if supervisors > len(self.professors):
+            return f"{supervisors} supervisors needed, {len(self.professors)} professors"
+        return None
+
+    def create_packs(self, groups, limit=None):
+        """
+        Pack a cohort's groups into as few rooms of at most `limit` seats
+        (default: the largest room) as possible, by best-fit decreasing:
+        - a group larger than the limit is split into near-equal parts
+          'A', 'B', 'C'... each sitting in its own room
+        - the other groups, largest first, go into the open pack that
+          has the least room left once they are in, or into a new pack;
+          packs never outgrow the limit
+        A pack that fits a salle is a salle pack (2 supervisors), any
+        larger one an amphi pack (3 supervisors). Returns a tuple of Pack,
+        empty when there are no rooms at all.
         """
+        if not self.max_room:
+            return ()
+        if limit is None:
+            limit = max(self.max_room.values())
+        salle_limit = self.max_room.get("salle", 0)
+
+        def pack(members, size, split_part=None):
+            return Pack("salle" if size <= salle_limit else "amphi",
+                        tuple(members), size, split_part)
+
+        # Deterministic order: by code, then largest first (stable sort)
+        groups = sorted(groups, key=lambda g: g.code_groupe)
 
         packs = []
+        bins = []  # [load, groups] of the packs being filled
+        for g in sorted(groups, key=lambda g: -g.effectif):
+            if g.effectif > limit:
+                parts = -(-g.effectif // limit)
+                base, extra = divmod(g.effectif, parts)
+                for k in range(parts):
+                    packs.append(pack([g], base + (k < extra), chr(ord("A") + k)))
+                continue
 
-        # Ensure deterministic order: G01, G02, ...
-        groups = sorted(groups, key=lambda g: g["code_groupe"])
-
-        i = 0
-        n = len(groups)
-
-        # ✅ SAFETY: Convert annee to string to avoid crashes
-        str_annee = str(annee) if annee is not None else ""
-
-        # ======================
-        # LICENCE CASE
-        # ======================
-        if str_annee.startswith("L"):
-            while i < n:
-                # Merge pairs
-                if i + 1 < n:
-                    packs.append({
-                        "type": "amphi",
-                        "groups": [groups[i], groups[i + 1]],
-                        "capacity": groups[i]["effectif"] + groups[i + 1]["effectif"],
-                        "split_part": None
-                    })
-                    i += 2
-                else:
-                    half = groups[i]["effectif"] // 2
-                    packs.append({
-                        "type": "salle",
-                        "groups": [groups[i]],
-                        "capacity": half,
-                        "split": True,
-                        "split_part": 'A'
-                    })
-                    packs.append({
-                        "type": "salle",
-                        "groups": [groups[i]],
-                        "capacity": half,
-                        "split": True,
-                        "split_part": 'B'
-                    })
-                    i += 1
-
-            return packs
-
-        # ======================
-        # MASTER CASE (unchanged)
-        # ======================
-        while i < n:
-            if i + 1 < n:
-                packs.append({
-                    "type": "amphi",
-                    "groups": [groups[i], groups[i + 1]],
-                    "capacity": groups[i]["effectif"] + groups[i + 1]["effectif"],
-                    "split_part": None
-                })
-                i += 2
-            else:
-                half = groups[i]["effectif"] // 2
-                packs.append({
-                    "type": "salle",
-                    "groups": [groups[i]],
-                    "capacity": half,
-                    "split": True,
-                    "split_part": 'A'
-                })
-                packs.append({
-                    "type": "salle",
-                    "groups": [groups[i]],
-                    "capacity": half,
-                    "split": True,
-                    "split_part": 'B'
-                })
-                i += 1
-
-        return packs
+            best = None
+            for b in bins:
+                if b[0] + g.effectif <= limit and (best is None or b[0] > best[0]):
+                    best = b
+            if best is None:
+                best = [0, []]
+                bins.append(best)
+            best[0] += g.effectif
+            best[1].append(g)
+
+        for load, members in bins:
+            members.sort(key=lambda g: g.code_groupe)
+            packs.append(pack(members, load))
+        return tuple(packs)
 
 
     # --------------------------------------------------
     # SLOT SELECTION
     # --------------------------------------------------
-    def find_slot(self, packs):
-        attempts = 0
-        while attempts < len(self.slots):
-            slot = self.slots[self.slot_ptr % len(self.slots)]
-            self.slot_ptr += 1
-            attempts += 1
-
-            conflict = False
-            for p in packs:
-                for g in p["groups"]:
-                    if self.group_has_exam_same_day(g["id_groupe"], slot["date"]):
-                        conflict = True
-                        break
-                if conflict:
-                    break
-
-            if not conflict:
-                return slot
+    @timed("find_slot")
+    def find_slot(self, packs, blocked_days=None, earliest=False):
+        """
+        Return the first slot (round-robin from slot_ptr) on a day where
+        none of the packs' groups already has an exam and every pack still
+        finds a free room, or None. blocked_days (students already sitting
+        an exam) are excluded too.
 
+        With earliest (dsatur engine) the earliest usable slot is taken
+        instead, so exams pack into few days.
+        """
+        n = len(self.slots)
+        rows = [g.idx for p in packs for g in p.groups]
+
+        # One OR over the pack groups' rows gives the blocked days
+        busy_days = self.group_day_busy[rows].any(axis=0)
+        if blocked_days is not None:
+            busy_days |= blocked_days
+        if earliest:
+            for idx in np.flatnonzero(~busy_days[self.slot_day]):
+                if self.rooms_fit(packs, int(idx)):
+                    return self.slots[int(idx)]
+            return None
+
+        free = np.flatnonzero(~busy_days[self.slot_day])
+
+        start = self.slot_ptr % n
+        pos = np.searchsorted(free, start)
+        # Candidates in round-robin order: from the pointer, then wrap around
+        for idx in np.concatenate((free[pos:], free[:pos])):
+            idx = int(idx)
+            if self.rooms_fit(packs, idx):
+                # Advance the pointer exactly as the slot-by-slot walk did
+                self.slot_ptr += (idx - start) % n + 1
+                return self.slots[idx]
+
+        self.slot_ptr += n
         return None
 
     # --------------------------------------------------
     # ROOM ASSIGNMENT
     # --------------------------------------------------
-    def assign_room(self, pack):
-        if pack["type"] == "amphi":
-            candidates = [r for r in self.amphis if r["capacite"] >= pack["capacity"]]
-            if not candidates:
-                return None
-            room = candidates[self.amphi_ptr % len(candidates)]
-            self.amphi_ptr += 1
-            return room
-        else:
-            candidates = [r for r in self.salles if r["capacite"] >= pack["capacity"]]
-            if not candidates:
-                return None
-            room = candidates[self.salle_ptr % len(candidates)]
-            self.salle_ptr += 1
-            return room
+    def free_rooms(self, room_type, capacity, slot_idx):
+        """
+        Positions (in capacity order) of the rooms of room_type holding at
+        least `capacity` seats that are still free at slot_idx.
+        """
+        start = bisect_left(self.room_caps[room_type], capacity)
+        rows = self.room_rows[room_type][start:]
+        return start + np.flatnonzero(~self.room_slot_busy[rows, slot_idx])
 
-    # --------------------------------------------------
-    # CONFLICT CHECK (OPTIMIZED)
-    # --------------------------------------------------
-    def group_has_exam_same_day(self, group_id, date):
+    def rooms_fit(self, packs, slot_idx):
         """
-        ✅ OPTIMIZED: Use in-memory cache instead of querying DB every time
+        Check that every pack gets its own free fitting room at slot_idx,
+        taking the smallest one for each pack as assign_room does.
         """
-        return date in self.group_exam_dates[group_id]
-    
+        taken = set()
+        for pack in packs:
+            room_type = pack.type
+            for pos in self.free_rooms(room_type, pack.capacity, slot_idx):
+                if (room_type, pos) not in taken:
+                    taken.add((room_type, pos))
+                    break
+            else:
+                return False
+        return True
+
+    @timed("assign_room")
+    def assign_room(self, pack, slot):
+        """
+        Smallest room of the pack's type that fits it and is free in slot.
+        The room is only reserved by book_room, once the pack is kept.
+        """
+        room_type = pack.type
+        free = self.free_rooms(room_type, pack.capacity, slot.idx)
+        if not free.size:
+            return None
+        return self.rooms_by_type[room_type][int(free[0])]
+
+    def book_room(self, room, slot):
+        self.room_slot_busy[room.idx, slot.idx] = True
+
+    def unbook_room(self, room, slot):
+        self.room_slot_busy[room.idx, slot.idx] = False
+
     def required_surveillants(self, room_type):
         """
         Returns number of professors needed to supervise an exam
@@ -274,109 +753,469 @@ class ExamScheduler:
         return 2
 
 
-    def pick_professors(self, exam_dept, room_type, exam_date, slot_time, exam_id):
+    def _heap_top(self, heap, parked, skip_dept=None):
+        """
+        Return the least-loaded valid entry of a professor heap (or None),
+        dropping stale entries and parking professors of skip_dept.
+        """
+        while heap:
+            total, p = heap[0]
+            if total != self.prof_total[p]:
+                heapq.heappop(heap)
+            elif skip_dept is not None and self.professors[p].id_dept == skip_dept:
+                parked.append(heapq.heappop(heap))
+            else:
+                return heap[0]
+        return None
+
+    def book_professors(self, profs, slot, exam_id):
+        """
+        Record professors (by idx) as supervising exam_id in slot: daily
+        and total counters, slot assignment and fresh heap entries.
+        """
+        for p in profs:
+            self.prof_slot[p, slot.idx] = exam_id
+            self.prof_day[p, slot.day] += 1
+            self.prof_total[p] += 1
+            entry = (self.prof_total[p], p)
+            heapq.heappush(self.global_heap, entry)
+            heapq.heappush(self.dept_heaps[self.professors[p].id_dept], entry)
+
+    def unbook_professors(self, profs, slot):
+        """
+        Undo book_professors for a slot (used by the local-search pass).
+        """
+        for p in profs:
+            self.prof_slot[p, slot.idx] = -1
+            self.prof_day[p, slot.day] -= 1
+            self.prof_total[p] -= 1
+            entry = (self.prof_total[p], p)
+            heapq.heappush(self.global_heap, entry)
+            heapq.heappush(self.dept_heaps[self.professors[p].id_dept], entry)
+
+    def free_professors(self, slot):
+        """
+        Boolean vector over professor idx: not supervising in slot yet and
+        under the daily cap on its day.
+        """
+        return ((self.prof_slot[:, slot.idx] < 0)
+                & (self.prof_day[:, slot.day] < MAX_DAILY_SURVEILLANCES))
+
+    @timed("pick_professors")
+    def pick_professors(self, exam_dept, room_type, slot, exam_id, warn=True, needed=None):
         """
         Select professors for an exam session (ONCE per pack).
-        Returns list of professor IDs and updates counters.
+        Returns list of professor indices (into self.professors) and
+        updates counters. `needed` overrides the room type's count (to
+        replace some of a pack's professors).
         
         CRITICAL: Checks that professors are not already assigned at this time slot.
         """
-        needed = self.required_surveillants(room_type)
+        if needed is None:
+            needed = self.required_surveillants(room_type)
         selected = []
-        
-        # Convert slot_time to string for consistent comparison
-        if hasattr(slot_time, 'strftime'):
-            slot_time_str = slot_time.strftime('%H:%M')
-        else:
-            slot_time_str = str(slot_time)
-        
-        # Convert exam_date to string for consistent comparison
-        if hasattr(exam_date, 'isoformat'):
-            exam_date_str = exam_date.isoformat()
-        else:
-            exam_date_str = str(exam_date)
-
-        # 1️⃣ Priority: same department
-        priority = self.profs_by_dept.get(exam_dept, [])
-
-        # 2️⃣ Fallback: other departments
-        others = [p for p in self.professors if p not in priority]
+        free = self.free_professors(slot)
 
-        # 3️⃣ Combined candidates
-        candidates = priority + others
-
-        # 4️⃣ Sort by fairness (least assigned goes first)
-        candidates = sorted(
-            candidates,
-            key=lambda p: self.prof_total[p["id_prof"]]
-        )
+        # Fairness order: least assigned first; on equal load the same
+        # department (priority) goes before the other departments (fallback).
+        dept_heap = self.dept_heaps.get(exam_dept, [])
+        parked_dept = []
+        parked_global = []
 
         # Debug tracking
         skipped_busy = 0
         skipped_daily_limit = 0
 
-        for prof in candidates:
-            pid = prof["id_prof"]
+        while len(selected) < needed:
+            top_dept = self._heap_top(dept_heap, parked_dept)
+            top_other = self._heap_top(self.global_heap, parked_global, skip_dept=exam_dept)
+            if top_dept is None and top_other is None:
+                break
+
+            if top_other is None or (top_dept is not None and top_dept[0] <= top_other[0]):
+                heap, parked = dept_heap, parked_dept
+            else:
+                heap, parked = self.global_heap, parked_global
+
+            entry = heapq.heappop(heap)
+            pid = entry[1]
 
-            # ✅ CRITICAL CHECK: Is this professor already assigned at this time slot?
-            slot_key = (exam_date_str, slot_time_str)
-            if slot_key in self.prof_slot_assignments[pid]:
-                skipped_busy += 1
-                continue  # Professor is already supervising another exam at this time
+            # Once loads go down again (unbook_professors) a professor can
+            # have two valid entries: drop the second one
+            if pid in selected:
+                continue
 
-            # Max 3 exams per day
-            if self.prof_daily[pid][exam_date_str] >= 3:
-                skipped_daily_limit += 1
+            # ✅ CRITICAL CHECK: already supervising in this slot, or
+            # at the daily cap (max 3 exams per day)
+            if not free[pid]:
+                if self.prof_slot[pid, slot.idx] >= 0:
+                    skipped_busy += 1
+                else:
+                    skipped_daily_limit += 1
+                parked.append(entry)
                 continue
 
             selected.append(pid)
-            
-            if len(selected) == needed:
-                break
 
         # Update counters ONCE for all selected professors
-        for pid in selected:
-            self.prof_daily[pid][exam_date_str] += 1
-            self.prof_total[pid] += 1
-            
-            # ✅ Mark this professor as assigned to this time slot (using string keys)
-            slot_key = (exam_date_str, slot_time_str)
-            self.prof_slot_assignments[pid][slot_key] = exam_id
-
-        if len(selected) < needed:
+        self.book_professors(selected, slot, exam_id)
+
+        # Skipped professors stay candidates for the next packs
+        for entry in parked_dept:
+            heapq.heappush(dept_heap, entry)
+        for entry in parked_global:
+            heapq.heappush(self.global_heap, entry)
+
+        if warn and len(selected) < needed:
             print(f"[WARNING] Exam {exam_id} ({room_type}): Only {len(selected)}/{needed} professors")
             print(f"          Skipped: {skipped_busy} busy, {skipped_daily_limit} daily limit")
-            print(f"          Available candidates: {len(candidates)}")
+            print(f"          Available candidates: {len(self.professors)}")
         
         return selected
 
+    def match_supervisors(self, planning_batch, surveillance_batch):
+        """
+        Re-assign the supervisors of the plan slot by slot, in date order:
+        all the seats of a slot are freed and solved together as one
+        min-cost matching (match_slot), so a pack placed early in a slot
+        no longer takes the professors a later pack's department needed.
+        Every pack keeps its number of supervisors. Returns the number of
+        cross-department seats before and after.
+        """
+        slot_of_ref = [self.slot_idx[id_creneau] for _, id_creneau, _ in planning_batch]
+        seats = defaultdict(list)   # slot idx -> [(ref, exam)] one per supervisor
+        booked = defaultdict(list)  # slot idx -> professor idxs
+        cross_before = 0
+        for id_prof, ref in surveillance_batch:
+            exam = self.exams[self.exam_idx[planning_batch[ref][0]]]
+            p = self.prof_idx[id_prof]
+            seats[slot_of_ref[ref]].append((ref, exam))
+            booked[slot_of_ref[ref]].append(p)
+            cross_before += self.professors[p].id_dept != exam.id_dept
+
+        matched = []
+        cross_after = 0
+        for slot_idx in sorted(seats):
+            slot = self.slots[slot_idx]
+            self.unbook_professors(booked[slot_idx], slot)
+            profs = self.match_slot(slot, [exam.id_dept for _, exam in seats[slot_idx]])
+            for (ref, exam), p in zip(seats[slot_idx], profs):
+                self.book_professors([p], slot, exam.id_examen)
+                matched.append((self.professors[p].id_prof, ref))
+                cross_after += self.professors[p].id_dept != exam.id_dept
+
+        surveillance_batch[:] = sorted(matched, key=lambda s: s[1])
+        return cross_before, cross_after
+
+    def match_slot(self, slot, seat_depts):
+        """
+        Professors (idx) for the seats of one slot, seat_depts[i] being the
+        department of seat i's exam. Minimizes the sum over seats of the
+        professor's load plus CROSS_DEPT_PENALTY when departments differ,
+        among professors free in the slot and under the daily cap.
+
+        Professors of one department only differ by load, so the matching
+        is solved as a min-cost flow between departments (professors' side
+        -> seats' side) by successive shortest paths: each step takes the
+        cheapest next professor, possibly shifting earlier choices to
+        another department's seats.
+        """
+        # Candidates per department, least loaded first
+        pools = defaultdict(list)
+        for p in np.flatnonzero(self.free_professors(slot)).tolist():
+            pools[self.professors[p].id_dept].append(p)
+        for pool in pools.values():
+            pool.sort(key=lambda p: (self.prof_total[p], p))
+
+        demand = defaultdict(int)
+        for d in seat_depts:
+            demand[d] += 1
+
+        def cost(g, d):
+            return 0 if g == d else CROSS_DEPT_PENALTY
+
+        taken = dict.fromkeys(pools, 0)
+        flow = defaultdict(int)  # (professors' dept, seats' dept) -> professors
+        for _ in seat_depts:
+            # Bellman-Ford from the source (next professor of each pool)
+            dist = {("g", g): self.prof_total[pool[taken[g]]]
+                    for g, pool in pools.items() if taken[g] < len(pool)}
+            prev = {}
+            for _ in range(len(pools) + len(demand)):
+                changed = False
+                for g in pools:
+                    if ("g", g) not in dist:
+                        continue
+                    for d in demand:
+                        c = dist[("g", g)] + cost(g, d)
+                        if c < dist.get(("d", d), float("inf")):
+                            dist[("d", d)] = c
+                            prev[("d", d)] = ("g", g)
+                            changed = True
+                for (g, d), f in flow.items():
+                    if f and ("d", d) in dist:
+                        c = dist[("d", d)] - cost(g, d)
+                        if c < dist.get(("g", g), float("inf")):
+                            dist[("g", g)] = c
+                            prev[("g", g)] = ("d", d)
+                            changed = True
+                if not changed:
+                    break
+
+            targets = [d for d in demand if demand[d] and ("d", d) in dist]
+            if not targets:
+                break
+            node = ("d", min(targets, key=lambda d: dist[("d", d)]))
+            demand[node[1]] -= 1
+            while node in prev:
+                before = prev[node]
+                if node[0] == "d":
+                    flow[(before[1], node[1])] += 1
+                else:
+                    flow[(node[1], before[1])] -= 1
+                node = before
+            taken[node[1]] += 1
+
+        # Hand the chosen professors out to the seats
+        chosen = defaultdict(list)  # seats' dept -> professors
+        for g, pool in pools.items():
+            picked = iter(pool[:taken[g]])
+            for d in list(demand):
+                chosen[d].extend(next(picked) for _ in range(flow[(g, d)]))
+        return [chosen[d].pop(0) for d in seat_depts]
+
 
     # --------------------------------------------------
     # MAIN GENERATION (OPTIMIZED WITH BATCH INSERTS)
     # --------------------------------------------------
     def generate(self):
 
-        self.load_data()
+        with self.phase("load_data"):
+            self.load_data()
+
+        # ✅ SKIP: the period's plan was already built from the same inputs
+        if not (self.force or self.dry_run):
+            existing = self.current_plan()
+            if existing:
+                return self.unchanged_report(existing)
 
-        # ---- Build waves
+        # ✅ OPTIMIZATION: Batch insert buffers
+        # Surveillances and planning_groupes reference their planning row by
+        # its position in planning_batch until real ids are reserved.
+        planning_batch = []
+        surveillance_batch = []
+        groupes_batch = []
+
+        # Why exams or packs were dropped: {"id_examen", "reason", ...}
+        self.skipped = []
+        infeasible = self.report_infeasible_cohorts()
+
+        with self.phase("schedule"):
+            if self.parallel:
+                placed, unplaced = self.schedule_parallel(
+                    planning_batch, surveillance_batch, groupes_batch
+                )
+            elif self.starts > 1:
+                placed, unplaced = self.schedule_multistart(
+                    planning_batch, surveillance_batch, groupes_batch
+                )
+            elif self.slot_engine == "dsatur":
+                placed, unplaced = self.run_dsatur(
+                    self.exams, planning_batch, surveillance_batch, groupes_batch
+                )
+            else:
+                placed, unplaced = self.run_waves(
+                    self.exams, planning_batch, surveillance_batch, groupes_batch
+                )
+
+        # ✅ OPTIONAL: Local search on the in-memory plan (see plan_improver.py)
+        improve_stats = None
+        if self.improve_seconds:
+            with self.phase("improve"):
+                placed, unplaced, improve_stats = self.improve(
+                    planning_batch, surveillance_batch, groupes_batch, placed, unplaced
+                )
+        skipped = len(unplaced)
+
+        # ✅ OPTIMIZATION: Supervisors re-assigned per slot as one matching
+        with self.phase("match_supervisors"):
+            cross_before, cross_after = self.match_supervisors(
+                planning_batch, surveillance_batch
+            )
+        print(f"[INFO] Supervisors matched per slot: {cross_before} -> {cross_after} "
+              f"cross-department surveillances")
+
+        # ✅ VERIFICATION: Check the plan in memory BEFORE writing anything
+        print("\n[VERIFICATION] Checking for conflicts...")
+        with self.phase("verify_plan"):
+            violations = self.verify_plan(planning_batch, surveillance_batch, groupes_batch)
+
+        if violations:
+            print(f"⚠️  Found {len(violations)} conflicts:")
+            for v in violations[:10]:  # Show first 10
+                print(f"  - {v}")
+            raise RuntimeError(
+                f"Generated plan has {len(violations)} conflicts, nothing was written"
+            )
+        print("✅ No conflicts detected")
+
+        report = {
+            "dry_run": self.dry_run,
+            "unchanged": False,
+            "fingerprint": self.fingerprint,
+            "metrics": self.plan_metrics(planning_batch, surveillance_batch, placed, skipped),
+            "skipped": self.skipped,
+            "infeasible_cohorts": infeasible,
+        }
+        if improve_stats:
+            report["improve"] = improve_stats
+        if self.starts > 1:
+            report["variants"] = self.variants
+
+        if self.dry_run:
+            # ✅ DRY RUN: hand the plan back instead of writing it
+            self.conn.rollback()
+            report["plan"] = self.plan_rows(planning_batch, surveillance_batch, groupes_batch)
+            print("[DRY RUN] Plan built in memory, nothing written")
+        else:
+            # ✅ STAGING: the new version is written and committed while
+            # readers keep seeing the active one
+            with self.phase("db_writes"):
+                version = plan_versions.create_version(
+                    self.conn, self.period_id, placed, skipped, self.fingerprint
+                )
+                self.write_plan(planning_batch, surveillance_batch, groupes_batch, version)
+                self.conn.commit()
+            print(f"[SUCCESS] Planning generation completed (version {version})")
+
+            # Optional audit: re-check the staged plan in the database
+            if self.audit:
+                print("\n[AUDIT] Checking for surveillance conflicts in the database...")
+                with self.phase("verify_no_conflicts"):
+                    problems = self.verify_no_conflicts(version)
+                if problems:
+                    plan_versions.mark_failed(self.conn, version)
+                    self.conn.commit()
+                    raise RuntimeError(f"Audit found {problems} problems in plan version "
+                                       f"{version}, it was not published")
+
+            # ✅ PUBLISH: switch the period to the new version in one step
+            with self.phase("publish"):
+                plan_versions.activate(self.conn, self.period_id, version)
+                dropped = plan_versions.prune(self.conn, self.period_id)
+                self.conn.commit()
+            print(f"[SUCCESS] Plan version {version} is active"
+                  + (f", {len(dropped)} old versions deleted" if dropped else ""))
+            report["id_version"] = version
+
+        stats = self.stats()
+        stats["exams_placed"] = placed
+        stats["exams_skipped"] = skipped
+        if not self.dry_run:
+            self.save_stats(stats)
+        report["stats"] = stats
+
+        self.emit("done", placed=placed, skipped=skipped, stats=stats)
+        return report
+
+    def report_infeasible_cohorts(self):
+        """Warn about the cohorts whose exams cannot be placed, before scheduling"""
+        infeasible = [
+            {"id_formation": formation, "annee": annee, "reason": reason}
+            for (formation, annee), reason in sorted(
+                self.infeasible_cohorts.items(), key=lambda item: str(item[0])
+            )
+        ]
+        for c in infeasible:
+            print(f"[WARNING] Formation {c['id_formation']} {c['annee']} cannot be seated "
+                  f"({c['reason']}), its exams will be skipped")
+        if infeasible:
+            self.emit("infeasible", cohorts=infeasible)
+        return infeasible
+
+    def unchanged_report(self, version):
+        """Report of a generation skipped because its inputs are unchanged"""
+        print(f"[INFO] Inputs unchanged since plan version {version['id_version']} "
+              f"(fingerprint {self.fingerprint[:12]}), keeping the existing plan")
+        self.conn.rollback()
+
+        stats = self.stats()
+        stats["exams_placed"] = version["exams_placed"]
+        stats["exams_skipped"] = version["exams_skipped"]
+        self.emit("done", placed=version["exams_placed"], skipped=version["exams_skipped"],
+                  stats=stats, unchanged=True)
+        return {
+            "dry_run": False,
+            "unchanged": True,
+            "fingerprint": self.fingerprint,
+            "id_version": version["id_version"],
+            "metrics": {
+                "exams_placed": version["exams_placed"],
+                "exams_skipped": version["exams_skipped"],
+            },
+            "skipped": [],
+            "stats": stats,
+        }
+
+    def improve(self, planning_batch, surveillance_batch, groupes_batch, placed, unplaced):
+        """
+        Run the local-search pass for improve_seconds and replace the
+        batches' contents with the improved plan. Returns the updated
+        placed count, the exams still unplaced and the move statistics.
+        """
+        improver = PlanImprover(
+            self, planning_batch, surveillance_batch, groupes_batch,
+            unplaced, MAX_DAILY_SURVEILLANCES
+        )
+        improve_stats = improver.run(self.improve_seconds)
+
+        planning_batch[:], surveillance_batch[:], groupes_batch[:] = improver.plan()
+
+        # Exams placed by the pass are no longer skipped
+        still_unplaced = {e.id_examen for e in improver.unplaced}
+        newly_placed = {e.id_examen for e in unplaced} - still_unplaced
+        self.skipped = [s for s in self.skipped if s["id_examen"] not in newly_placed]
+
+        print(f"[IMPROVE] {improve_stats['moves']} moves in {improve_stats['seconds']}s: "
+              f"{improve_stats['inserted']} exams placed, "
+              f"prof load std {improve_stats['prof_load_std_before']} -> "
+              f"{improve_stats['prof_load_std_after']}")
+        self.emit("improve", **improve_stats)
+
+        remaining = [e for e in unplaced if e.id_examen in still_unplaced]
+        return placed + improve_stats["inserted"], remaining, improve_stats
+
+    def build_waves(self, exams):
+        """
+        Wave k holds the k-th exam (by module) of every formation/year.
+        """
         exams_by_fy = defaultdict(list)
-        for e in self.exams:
-            exams_by_fy[(e["id_formation"], e["annee"])].append(e)
+        for e in exams:
+            exams_by_fy[(e.id_formation, e.annee)].append(e)
 
         for k in exams_by_fy:
-            exams_by_fy[k].sort(key=lambda x: x["id_module"])
+            exams_by_fy[k].sort(key=lambda x: x.id_module)
+            if self.rng:
+                self.rng.shuffle(exams_by_fy[k])
 
         waves = defaultdict(list)
-        for (formation, annee), exams in exams_by_fy.items():
-            for idx, exam in enumerate(exams):
+        for (formation, annee), fy_exams in exams_by_fy.items():
+            for idx, exam in enumerate(fy_exams):
                 waves[idx].append(exam)
 
+        return waves
+
+    def run_waves(self, exams, planning_batch, surveillance_batch, groupes_batch):
+        """
+        Schedule exams wave by wave, round-robin by department, into the
+        batches. Returns the number of exams placed and the list of exams
+        that got no pack at all.
+        """
+        waves = self.build_waves(exams)
         print(f"[INFO] Total waves: {len(waves)}")
 
-        # ✅ OPTIMIZATION: Batch insert buffers
-        planning_batch = []
-        surveillance_batch = []
-        groupes_batch = []
+        placed = 0
+        unplaced = []
 
         # ---- Schedule wave by wave
         for wave_idx in sorted(waves.keys()):
@@ -385,116 +1224,1026 @@ class ExamScheduler:
             wave_exams = waves[wave_idx]
 
             # Round-robin by department
-            for dept_id in self.departments:
+            departments = self.departments
+            if self.rng:
+                departments = self.rng.sample(departments, len(departments))
+            for dept_id in departments:
                 dept_exams = [
                     e for e in wave_exams
-                    if e["id_dept"] == dept_id
+                    if e.id_dept == dept_id
                 ]
+                if self.rng:
+                    self.rng.shuffle(dept_exams)
 
                 for exam in dept_exams:
-                    fy = (exam["id_formation"], exam["annee"])
-                    groups = self.groups_by_fy.get(fy, [])
-                    if not groups:
-                        continue
+                    scheduled = self.schedule_exam(
+                        exam, planning_batch, surveillance_batch, groupes_batch
+                    )
+                    if scheduled is True:
+                        placed += 1
+                    elif scheduled is False:
+                        unplaced.append(exam)
 
-                    packs = self.create_packs(groups, exam["annee"])
-                    slot = self.find_slot(packs)
-                    if not slot:
-                        print(f"  [SKIP] Exam {exam['id_examen']} (no slot)")
-                        continue
+            self.emit("wave", wave=wave_idx + 1, total_waves=len(waves),
+                      wave_exams=len(wave_exams), placed=placed, skipped=len(unplaced))
 
-                    # Track if at least one pack was successfully scheduled
-                    successfully_scheduled_packs = []
-
-                    # Now assign rooms and professors for EACH PACK separately
-                    for pack in packs:
-                        room = self.assign_room(pack)
-                        if not room:
-                            print(f"  [SKIP] No room for pack")
-                            continue
-
-                        # ✅ FIX: Pick professors PER PACK (not per exam)
-                        # Each pack is a separate physical location that needs supervision
-                        pack_profs = self.pick_professors(
-                            exam_dept=exam["id_dept"],
-                            room_type=pack["type"],  # Use pack's room type, not global
-                            exam_date=slot["date"],
-                            slot_time=slot["heure_debut"],
-                            exam_id=exam["id_examen"]
-                        )
-                        
-                        # ✅ CRITICAL: Don't create planning if we don't have enough professors
-                        needed = self.required_surveillants(pack["type"])
-                        if len(pack_profs) < needed:
-                            print(f"  [SKIP] Pack for exam {exam['id_examen']}: "
-                                  f"Insufficient professors ({len(pack_profs)}/{needed})")
-                            continue
-
-                        # ✅ PostgreSQL: Use RETURNING to get id_planning
-                        self.cursor.execute("""
-                            INSERT INTO planning_examens (id_examen, id_creneau, id_lieu)
-                            VALUES (%s, %s, %s)
-                            RETURNING id_planning
-                        """, (exam["id_examen"], slot["id_creneau"], room["id_lieu"]))
-
-                        planning_id = self.cursor.fetchone()["id_planning"]
-
-                        # ✅ Batch: Collect surveillance data (pack-specific professors)
-                        for pid in pack_profs:
-                            surveillance_batch.append((pid, planning_id))
-
-                        # Handle merged/split group labels
-                        if len(pack["groups"]) > 1:
-                            merged_codes = "+".join(g["code_groupe"] for g in pack["groups"])
-                        else:
-                            merged_codes = None
-
-                        # ✅ Batch: Collect planning_groupes data
-                        for g in pack["groups"]:
-                            groupes_batch.append((
-                                planning_id,
-                                g["id_groupe"],
-                                pack["split_part"],
-                                merged_codes
-                            ))
-                        
-                        # Track successfully scheduled pack
-                        successfully_scheduled_packs.append(pack)
-                    
-                    # ✅ CRITICAL FIX: Update group_exam_dates ONCE per exam, AFTER all packs
-                    # This prevents fake conflicts between packs of the same exam
-                    if successfully_scheduled_packs:
-                        for g in groups:
-                            self.group_exam_dates[g["id_groupe"]].add(slot["date"])
-
-        # ✅ BATCH INSERT: surveillances
-        if surveillance_batch:
-            print(f"[INFO] Inserting {len(surveillance_batch)} surveillances...")
-            execute_values(
-                self.cursor,
-                "INSERT INTO surveillances (id_prof, id_planning) VALUES %s",
-                surveillance_batch
+        return placed, unplaced
+
+    def run_dsatur(self, exams, planning_batch, surveillance_batch, groupes_batch):
+        """
+        Schedule exams in DSatur order over the student conflict graph:
+        the exam whose conflicting exams already span the most days goes
+        next, on the earliest day none of them uses (the colour). Same
+        return value as run_waves.
+        """
+        order = DSaturOrder(
+            self.conflicts, len(self.days), [e.idx for e in exams]
+        )
+        print(f"[INFO] DSatur colouring of {len(exams)} exams over {len(self.days)} days")
+
+        placed = 0
+        unplaced = []
+        for n, i in enumerate(order, 1):
+            exam = self.exams[i]
+            scheduled = self.schedule_exam(
+                exam, planning_batch, surveillance_batch, groupes_batch
+            )
+            if scheduled is True:
+                placed += 1
+            elif scheduled is False:
+                unplaced.append(exam)
+            order.color(i, int(self.exam_day[i]) if scheduled else None)
+
+            if n % 100 == 0 or n == len(exams):
+                self.emit("coloring", colored=n, total=len(exams),
+                          placed=placed, skipped=len(unplaced))
+
+        return placed, unplaced
+
+    # --------------------------------------------------
+    # MULTI-START (SEEDED VARIANTS, BEST PLAN KEPT)
+    # --------------------------------------------------
+    def randomize(self, seed):
+        """
+        Make run_waves a seeded variant: shuffled exam order within each
+        formation/year (so different waves), shuffled department and exam
+        order within a wave, and a random starting slot pointer.
+        """
+        self.rng = random.Random(seed)
+        self.slot_ptr = self.rng.randrange(len(self.slots))
+
+    def input_rows(self):
+        """The loaded inputs back as the row lists prepare() takes"""
+        return {
+            "slots": [s.row() for s in self.slots],
+            "rooms": [r.row() for r in self.rooms],
+            "departments": list(self.departments),
+            "formations": [{"id_formation": f, "id_dept": d}
+                           for d, fs in self.formations_by_dept.items() for f in fs],
+            "groups": [g.row() for g in self.groups],
+            "exams": [e.row() for e in self.exams],
+            "professors": [p.row() for p in self.professors],
+            "enrolments": self.enrolments,
+        }
+
+    @staticmethod
+    def plan_score(metrics):
+        """
+        Sort key of a plan's metrics, best first: most exams placed, then
+        the most even professor load, then the fewest days used.
+        """
+        return (-metrics["exams_placed"], metrics["prof_load_std"], metrics["days_used"])
+
+    def schedule_multistart(self, planning_batch, surveillance_batch, groupes_batch):
+        """
+        Schedule `starts` variants of the whole period in a process pool
+        (variant 0 is the plain deterministic order, the others are seeded
+        from self.seed), then keep the best plan by plan_score and replay
+        it on the scheduler's state.
+        """
+        data = self.input_rows()
+        seeds = [None] + [self.seed + k for k in range(1, self.starts)]
+        workers = self.workers or min(self.starts, os.cpu_count() or 1)
+        print(f"[INFO] Multi-start: {self.starts} variants on {workers} processes")
+
+        results = []
+        with self.phase("schedule_variants"):
+            # spawn: the API process is multi-threaded, fork is not safe there
+            with ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            ) as pool:
+                futures = [
+                    pool.submit(schedule_variant, self.period_id, data, seed)
+                    for seed in seeds
+                ]
+                for future in futures:
+                    result = future.result()
+                    results.append(result)
+                    self.emit("variant", seed=result["seed"], placed=result["placed"],
+                              skipped=len(result["unplaced"]))
+
+        best = min(results, key=lambda r: self.plan_score(r["metrics"]))
+        self.variants = [
+            {"seed": r["seed"], "best": r is best,
+             **{k: r["metrics"][k] for k in ("exams_placed", "prof_load_std", "days_used")}}
+            for r in results
+        ]
+        for v in self.variants:
+            print(f"  {'*' if v['best'] else ' '} seed {v['seed']}: {v['exams_placed']} exams, "
+                  f"prof load std {v['prof_load_std']}, {v['days_used']} days")
+
+        self.merge_partition(best, planning_batch, surveillance_batch, groupes_batch)
+        return best["placed"], [self.exams[self.exam_idx[eid]] for eid in best["unplaced"]]
+
+    # --------------------------------------------------
+    # INCREMENTAL UPDATE
+    # --------------------------------------------------
+    def update(self, closed_rooms=(), unavailable_profs=()):
+        """
+        Repair the period's existing plan instead of rebuilding it:
+        load it into the in-memory state, invalidate only what the
+        changes touch and re-place just that, then write the difference.
+
+        - closed_rooms (id_lieu): their packs move to another room of
+          the same slot
+        - unavailable_profs (id_prof): their surveillances go to other
+          professors free in the same slot
+        - packs whose groups outgrew their room (effectif) move the same
+          way; exams whose cohort's groups changed, or sharing students
+          with another exam of their day, are re-placed
+        Exams that cannot be repaired in place are re-placed whole (in
+        their old slot when it still works), packs missing from a kept
+        exam are seated in its slot, and exams without any planning row
+        are placed if possible. Exams of the old plan that end up without
+        a row are listed in the diff as exams_dropped.
+        """
+        with self.phase("load_data"):
+            self.load_data()
+        self.skipped = []
+        infeasible = self.report_infeasible_cohorts()
+
+        with self.phase("load_plan"):
+            version = plan_versions.active_version(self.conn, self.period_id)
+            rows = self.fetch_plan(version)
+            kept = self.book_plan(rows)
+
+        with self.phase("invalidate"):
+            closed = [self.room_idx[r] for r in closed_rooms if r in self.room_idx]
+            away = {self.prof_idx[p] for p in unavailable_profs if p in self.prof_idx}
+            invalid, reroom, missing = self.check_plan(kept, set(closed))
+            if self.clashes is not None:
+                # A plan from before student checks: the later exam of
+                # each pair sharing students on a day moves
+                invalid |= {self.exams[b].id_examen
+                            for _, b, _ in self.clashes.clashing_pairs(self.exam_day)}
+
+            # Free what the invalid exams, the packs needing another room
+            # and the unavailable professors held, then block the closed
+            # rooms and those professors for the whole period
+            old_slots = {}
+            for row in kept:
+                if row["exam"].id_examen in invalid:
+                    self.unbook_plan_row(row)
+                    old_slots[row["exam"].id_examen] = row["slot"]
+            kept = [row for row in kept if row["exam"].id_examen not in invalid]
+
+            for row in reroom:
+                self.unbook_room(row["room"], row["slot"])
+                row["room"] = None
+
+            short = []
+            for row in kept:
+                gone = [p for p in row["profs"] if p in away]
+                if gone:
+                    self.unbook_professors(gone, row["slot"])
+                    row["profs"] = [p for p in row["profs"] if p not in away]
+                    short.append((row, gone))
+
+            self.room_slot_busy[closed, :] = True
+            self.global_heap = [(self.prof_total[p], p) for p in range(len(self.professors))
+                                if p not in away]
+            heapq.heapify(self.global_heap)
+            for dept, heap in self.dept_heaps.items():
+                heap[:] = [e for e in self.global_heap if self.professors[e[1]].id_dept == dept]
+                heapq.heapify(heap)
+
+        with self.phase("schedule"):
+            # Another room in the same slot for packs that lost theirs
+            moved = []
+            for row in reroom:
+                room = self.assign_room(row["pack"], row["slot"])
+                if room is None:
+                    invalid.add(row["exam"].id_examen)
+                    continue
+                self.book_room(room, row["slot"])
+                row["room"] = room
+                moved.append(row)
+
+            # Replacement professors, in the same slot as before
+            replaced = []
+            for row, gone in short:
+                exam = row["exam"]
+                if exam.id_examen in invalid:
+                    continue
+                profs = self.pick_professors(exam.id_dept, row["room"].type, row["slot"],
+                                             exam.id_examen, needed=len(gone))
+                if len(profs) < len(gone):
+                    # Nobody free: the whole exam has to move
+                    self.unbook_professors(profs, row["slot"])
+                    invalid.add(exam.id_examen)
+                    continue
+                row["profs"] += profs
+                replaced.append((row, gone, profs))
+
+            for row in kept:
+                if row["exam"].id_examen in invalid:
+                    self.unbook_plan_row(row)
+                    old_slots[row["exam"].id_examen] = row["slot"]
+            kept = [row for row in kept if row["exam"].id_examen not in invalid]
+            moved = [row for row in moved if row["exam"].id_examen not in invalid]
+            replaced = [r for r in replaced if r[0]["exam"].id_examen not in invalid]
+
+            # The full plan: kept rows first, new rows appended after them
+            planning_batch = [(r["exam"].id_examen, r["slot"].id_creneau, r["room"].id_lieu)
+                              for r in kept]
+            surveillance_batch = [(self.professors[p].id_prof, ref)
+                                  for ref, r in enumerate(kept) for p in r["profs"]]
+            groupes_batch = [(ref, gid, r["split_part"], r["merged_groups"])
+                             for ref, r in enumerate(kept) for gid in r["groups"]]
+
+            # Packs missing from a kept exam, in the exam's slot (its
+            # other packs stay where they are)
+            added = 0
+            for exam, slot, pack in missing:
+                if exam.id_examen in invalid:
+                    continue
+                if self.group_day_busy[[g.idx for g in pack.groups], slot.day].any():
+                    print(f"  [SKIP] Pack for exam {exam.id_examen}: groups busy that day")
+                    self.skipped.append({
+                        "id_examen": exam.id_examen,
+                        "reason": "groups busy",
+                        "groups": [g.code_groupe for g in pack.groups],
+                    })
+                    continue
+                if self.place_pack(exam, pack, slot, planning_batch, surveillance_batch, groupes_batch):
+                    self.mark_exam_day(exam, pack.groups, slot)
+                    added += 1
+
+            planned = {r["exam"].id_examen for r in kept}
+            todo = [e for e in self.exams if e.id_examen in invalid] + \
+                   [e for e in self.exams if e.id_examen not in planned and e.id_examen not in invalid]
+            for exam in todo:
+                self.schedule_exam(exam, planning_batch, surveillance_batch, groupes_batch,
+                                   preferred_slot=old_slots.get(exam.id_examen))
+
+        print("\n[VERIFICATION] Checking for conflicts...")
+        with self.phase("verify_plan"):
+            violations = self.verify_plan(planning_batch, surveillance_batch, groupes_batch)
+        if violations:
+            for v in violations[:10]:
+                print(f"  - {v}")
+            raise RuntimeError(
+                f"Updated plan has {len(violations)} conflicts, nothing was written"
+            )
+        print("✅ No conflicts detected")
+
+        new = len(kept)
+        kept_ids = {r["id_planning"] for r in kept}
+        deleted = [r["id_planning"] for r in rows if r["id_planning"] not in kept_ids]
+        # Exams of the old plan left without any row (e.g. a closed room
+        # and no free room elsewhere)
+        dropped = sorted({r["id_examen"] for r in rows} - {row[0] for row in planning_batch})
+        removed_surv = [(self.professors[p].id_prof, row["id_planning"])
+                        for row, gone, _ in replaced for p in gone]
+        added_surv = [(self.professors[p].id_prof, row["id_planning"])
+                      for row, _, profs in replaced for p in profs]
+        diff = {
+            "exams_replaced": sorted(invalid),
+            "exams_dropped": dropped,
+            "packs_moved": len(moved),
+            "packs_added": added,
+            "planning_deleted": len(deleted),
+            "planning_inserted": len(planning_batch) - new,
+            "surveillances_replaced": len(added_surv),
+        }
+        print(f"[UPDATE] {len(invalid)} exams re-placed, {len(moved)} packs moved, "
+              f"{added} packs added, {diff['planning_deleted']} rows deleted, "
+              f"{diff['planning_inserted']} inserted, {len(added_surv)} surveillances replaced")
+        if dropped:
+            print(f"[WARNING] {len(dropped)} exams dropped from the plan: {dropped}")
+
+        placed = len({row[0] for row in planning_batch})
+        skipped = len(self.exams) - placed
+        report = {
+            "dry_run": self.dry_run,
+            "unchanged": False,
+            "incremental": True,
+            "diff": diff,
+            "metrics": self.plan_metrics(planning_batch, surveillance_batch, placed, skipped),
+            "skipped": self.skipped,
+            "infeasible_cohorts": infeasible,
+        }
+
+        if self.dry_run:
+            self.conn.rollback()
+            print("[DRY RUN] Update built in memory, nothing written")
+        elif not (deleted or moved or added_surv or len(planning_batch) > new):
+            self.conn.rollback()
+            print("[INFO] Nothing to update")
+        else:
+            # The active version is repaired in place, in one transaction;
+            # retired versions are left untouched for rollback
+            with self.phase("db_writes"):
+                self.write_diff(version, deleted,
+                                [(r["id_planning"], r["room"].id_lieu) for r in moved],
+                                removed_surv, added_surv,
+                                planning_batch[new:],
+                                [(pid, ref - new) for pid, ref in surveillance_batch if ref >= new],
+                                [(g[0] - new,) + g[1:] for g in groupes_batch if g[0] >= new])
+                if version is not None:
+                    # No longer what a full generation would build from these inputs
+                    self.cursor.execute("""
+                        UPDATE plan_versions
+                        SET exams_placed = %s, exams_skipped = %s, input_fingerprint = NULL
+                        WHERE id_version = %s
+                    """, (placed, skipped, version))
+                self.conn.commit()
+            print("[SUCCESS] Planning update committed")
+
+        stats = self.stats()
+        stats["exams_placed"] = placed
+        stats["exams_skipped"] = skipped
+        if not self.dry_run:
+            self.save_stats(stats)
+        report["stats"] = stats
+
+        self.emit("done", placed=placed, skipped=skipped, stats=stats)
+        return report
+
+    def fetch_plan(self, version):
+        """
+        Planning rows of the period's plan version (None: rows written
+        before plan versions) with their professors and groups
+        """
+        self.cursor.execute("""
+            SELECT
+                pe.id_planning,
+                pe.id_examen,
+                pe.id_creneau,
+                pe.id_lieu,
+                COALESCE((
+                    SELECT array_agg(s.id_prof ORDER BY s.id_prof)
+                    FROM surveillances s
+                    WHERE s.id_planning = pe.id_planning
+                ), '{}') AS profs,
+                COALESCE((
+                    SELECT array_agg(pg.id_groupe ORDER BY pg.id_groupe)
+                    FROM planning_groupes pg
+                    WHERE pg.id_planning = pe.id_planning
+                ), '{}') AS groups,
+                (
+                    SELECT MAX(pg.split_part)
+                    FROM planning_groupes pg
+                    WHERE pg.id_planning = pe.id_planning
+                ) AS split_part,
+                (
+                    SELECT MAX(pg.merged_groups)
+                    FROM planning_groupes pg
+                    WHERE pg.id_planning = pe.id_planning
+                ) AS merged_groups
+            FROM planning_examens pe
+            JOIN creneaux c ON c.id_creneau = pe.id_creneau
+            WHERE c.id_periode = %s
+            AND pe.id_version IS NOT DISTINCT FROM %s
+            ORDER BY pe.id_planning
+        """, (self.period_id, version))
+        return self.cursor.fetchall()
+
+    def book_plan(self, rows):
+        """
+        Book the existing plan's rooms, professors and group days in the
+        in-memory state. Returns its rows with records instead of ids;
+        rows whose slot, room or exam is gone are left out (re-placed).
+        """
+        kept = []
+        for r in rows:
+            if (r["id_creneau"] not in self.slot_idx or r["id_lieu"] not in self.room_idx
+                    or r["id_examen"] not in self.exam_idx):
+                continue
+            exam = self.exams[self.exam_idx[r["id_examen"]]]
+            slot = self.slots[self.slot_idx[r["id_creneau"]]]
+            row = {
+                "id_planning": r["id_planning"],
+                "exam": exam,
+                "slot": slot,
+                "room": self.rooms[self.room_idx[r["id_lieu"]]],
+                "profs": [self.prof_idx[p] for p in r["profs"] if p in self.prof_idx],
+                "groups": list(r["groups"]),
+                "split_part": r["split_part"],
+                "merged_groups": r["merged_groups"],
+            }
+            self.book_room(row["room"], slot)
+            self.book_professors(row["profs"], slot, exam.id_examen)
+            self.mark_exam_day(exam, [self.groups[self.group_idx[g]] for g in row["groups"]
+                                      if g in self.group_idx], slot)
+            kept.append(row)
+        return kept
+
+    def unbook_plan_row(self, row):
+        if row["room"] is not None:
+            self.unbook_room(row["room"], row["slot"])
+        self.unbook_professors(row["profs"], row["slot"])
+        self.unmark_exam_day(row["exam"], [self.groups[self.group_idx[g]] for g in row["groups"]
+                                           if g in self.group_idx], row["slot"])
+
+    def check_plan(self, rows, closed):
+        """
+        Compare the loaded plan with the current data. Returns the ids of
+        exams to re-place (their packs match none of the cohort's packings,
+        or a room changed type), the rows whose pack only needs another
+        room (closed, or too small now; those rows get their "pack") and
+        the (exam, slot, pack) of cohort packs missing from an exam's rows
+        (skipped when it was placed, or a new group), to seat in its slot.
+        """
+        def key(groups, split_part):
+            return tuple(sorted(groups)), None if split_part is None else str(split_part)
+
+        planned = defaultdict(list)
+        for row in rows:
+            planned[row["exam"].id_examen].append(row)
+
+        invalid = set()
+        reroom = []
+        missing = []
+        for exam_id, exam_rows in planned.items():
+            exam = exam_rows[0]["exam"]
+            fy = (exam.id_formation, exam.annee)
+            # The packing the exam was seated with: the first one holding
+            # all of its rows
+            row_keys = [key(row["groups"], row["split_part"]) for row in exam_rows]
+            for packing in self.cohort_packings.get(fy) or (self.cohort_packs.get(fy, ()),):
+                packs = {key([g.id_groupe for g in p.groups], p.split_part): p for p in packing}
+                if all(k in packs for k in row_keys):
+                    break
+            moves = []
+            for row, row_key in zip(exam_rows, row_keys):
+                pack = packs.pop(row_key, None)
+                if pack is None or (row["room"].type == "amphi") != (pack.type == "amphi"):
+                    invalid.add(exam_id)
+                    break
+                if row["room"].idx in closed or row["room"].capacite < pack.capacity:
+                    row["pack"] = pack
+                    moves.append(row)
+            else:
+                reroom.extend(moves)
+                if fy not in self.infeasible_cohorts:
+                    missing.extend((exam, exam_rows[0]["slot"], p) for p in packs.values())
+        return invalid, reroom, missing
+
+    def write_diff(self, version, deleted, moved, removed_surv, added_surv,
+                   planning_batch, surveillance_batch, groupes_batch):
+        """
+        Apply an incremental update to plan version `version`: delete the
+        invalidated planning rows, change the room of moved ones
+        ((id_planning, id_lieu) pairs), swap the replaced surveillances and
+        COPY the new rows.
+        """
+        if deleted:
+            for table in ("surveillances", "planning_groupes", "planning_examens"):
+                self.cursor.execute(
+                    f"DELETE FROM {table} WHERE id_planning = ANY(%s)", (deleted,)
+                )
+        if removed_surv:
+            self.cursor.execute("""
+                DELETE FROM surveillances s
+                USING unnest(%s::int[], %s::int[]) AS d(id_prof, id_planning)
+                WHERE s.id_prof = d.id_prof AND s.id_planning = d.id_planning
+            """, ([p for p, _ in removed_surv], [r for _, r in removed_surv]))
+        if moved:
+            self.cursor.execute("""
+                UPDATE planning_examens pe
+                SET id_lieu = d.id_lieu
+                FROM unnest(%s::int[], %s::int[]) AS d(id_planning, id_lieu)
+                WHERE pe.id_planning = d.id_planning
+            """, ([r for r, _ in moved], [l for _, l in moved]))
+        if added_surv:
+            copy_rows(self.cursor, "surveillances", ("id_prof", "id_planning"), added_surv)
+        if planning_batch:
+            self.write_plan(planning_batch, surveillance_batch, groupes_batch, version)
+
+    # --------------------------------------------------
+    # PARALLEL MODE (PARTITION BY DEPARTMENT)
+    # --------------------------------------------------
+    def partition_by_department(self):
+        """
+        Split the inputs into one self-contained partition per department:
+        its exams, groups and professors, all slots, and a quota of rooms.
+        Rooms of each type are shared out in proportion to the number of
+        packs of that type the department needs (D'Hondt, largest rooms
+        first), so partitions never compete for a room.
+        """
+        demand = defaultdict(lambda: defaultdict(int))
+        for exam in self.exams:
+            for pack in self.cohort_packs.get((exam.id_formation, exam.annee), ()):
+                demand[exam.id_dept][pack.type] += 1
+
+        rooms_of = defaultdict(list)
+        for room_type, rooms in self.rooms_by_type.items():
+            allocated = defaultdict(int)
+            wanting = [d for d in self.departments if demand[d][room_type]]
+            if not wanting:
+                continue
+            for room in sorted(rooms, key=lambda r: -r.capacite):
+                dept = max(wanting, key=lambda d: demand[d][room_type] / (allocated[d] + 1))
+                allocated[dept] += 1
+                rooms_of[dept].append(room)
+
+        partitions = []
+        for dept in self.departments:
+            formations = set(self.formations_by_dept[dept])
+            partitions.append({
+                "dept": dept,
+                "slots": [s.row() for s in self.slots],
+                "rooms": [r.row() for r in sorted(rooms_of[dept], key=lambda r: r.capacite)],
+                "departments": [dept],
+                "formations": [{"id_formation": f, "id_dept": dept} for f in formations],
+                "groups": [g.row() for g in self.groups if g.id_formation in formations],
+                "exams": [e.row() for e in self.exams if e.id_dept == dept],
+                "professors": [p.row() for p in self.profs_by_dept[dept]],
+                "enrolments": self.enrolments,
+                "max_room": self.max_room,
+                "pack_limits": self.pack_limits,
+            })
+        return partitions
+
+    def schedule_parallel(self, planning_batch, surveillance_batch, groupes_batch):
+        """
+        Schedule every department partition in a process pool, merge the
+        partial plans (in department order, so the result is deterministic)
+        and then place the exams the partitions could not, against the
+        merged state with all rooms and cross-department professors.
+        """
+        partitions = self.partition_by_department()
+        workers = self.workers or min(len(partitions), os.cpu_count() or 1)
+        print(f"[INFO] Scheduling {len(partitions)} departments on {workers} processes")
+
+        placed = 0
+        retry = []
+        with self.phase("schedule_partitions"):
+            # spawn: the API process is multi-threaded, fork is not safe there
+            with ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            ) as pool:
+                futures = [
+                    pool.submit(schedule_partition, self.period_id, part)
+                    for part in partitions
+                ]
+                for future in futures:
+                    result = future.result()
+                    rejected = self.merge_partition(
+                        result, planning_batch, surveillance_batch, groupes_batch
+                    )
+                    placed += result["placed"] - len(rejected)
+                    retry.extend(self.exams[self.exam_idx[eid]]
+                                 for eid in list(result["unplaced"]) + sorted(rejected))
+                    self.emit("partition", dept=result["dept"],
+                              placed=result["placed"] - len(rejected),
+                              skipped=len(result["unplaced"]) + len(rejected))
+
+        # ---- Reconciliation: retry unplaced exams with every resource
+        with self.phase("reconcile"):
+            retry_ids = {e.id_examen for e in retry}
+            self.skipped = [s for s in self.skipped if s["id_examen"] not in retry_ids]
+            print(f"[INFO] Reconciling {len(retry)} exams not placed in their partition")
+            placed_retry, unplaced = self.run_waves(
+                retry, planning_batch, surveillance_batch, groupes_batch
             )
 
-        # ✅ BATCH INSERT: planning_groupes
+        return placed + placed_retry, unplaced
+
+    def merge_partition(self, result, planning_batch, surveillance_batch, groupes_batch):
+        """
+        Append a partition's plan to the batches and replay it on the
+        scheduler's occupancy state (rooms, professors, group and student
+        days). An exam sharing students with an exam already merged on
+        the same day (another department's) is left out; the ids of those
+        exams are returned, to be placed again.
+        """
+        part_planning, part_surveillances, part_groupes = result["batches"]
+
+        exam_slots = {}
+        for exam_id, id_creneau, _ in part_planning:
+            exam_slots.setdefault(exam_id, self.slots[self.slot_idx[id_creneau]])
+
+        rejected = set()
+        for exam_id, slot in exam_slots.items():
+            exam = self.exams[self.exam_idx[exam_id]]
+            if self.blocked_days(exam)[slot.day]:
+                rejected.add(exam_id)
+                continue
+            self.mark_exam_day(exam, self.groups_by_fy[(exam.id_formation, exam.annee)], slot)
+
+        # Partition refs -> refs in the merged batches (None: left out)
+        new_ref = []
+        for exam_id, id_creneau, id_lieu in part_planning:
+            if exam_id in rejected:
+                new_ref.append(None)
+                continue
+            new_ref.append(len(planning_batch))
+            planning_batch.append((exam_id, id_creneau, id_lieu))
+            self.book_room(self.rooms[self.room_idx[id_lieu]], exam_slots[exam_id])
+
+        profs_by_ref = defaultdict(list)
+        for pid, ref in part_surveillances:
+            if new_ref[ref] is not None:
+                surveillance_batch.append((pid, new_ref[ref]))
+                profs_by_ref[ref].append(self.prof_idx[pid])
+        for ref, profs in profs_by_ref.items():
+            exam_id = part_planning[ref][0]
+            self.book_professors(profs, exam_slots[exam_id], exam_id)
+
+        groupes_batch.extend(
+            (new_ref[ref],) + tuple(rest) for ref, *rest in part_groupes
+            if new_ref[ref] is not None
+        )
+
+        self.skipped.extend(result["skipped"])
+        for name, v in result["phases"].items():
+            self.phase_stats[name]["seconds"] += v["seconds"]
+            self.phase_stats[name]["calls"] += v["calls"]
+        return rejected
+
+    def schedule_exam(self, exam, planning_batch, surveillance_batch, groupes_batch,
+                      preferred_slot=None):
+        """
+        Place one exam: pick its slot, then a room and professors per pack,
+        appending the kept packs to the batches. The cohort's packings are
+        tried in turn, so an exam whose large rooms are all taken is seated
+        in smaller ones. Returns True if at least
+        one pack was kept, False if the exam was skipped and None if its
+        cohort has no groups.
+
+        preferred_slot (incremental update) is taken when it is still
+        usable, so a re-placed exam keeps its date where possible.
+        """
+        fy = (exam.id_formation, exam.annee)
+        groups = self.groups_by_fy.get(fy, [])
+        if not groups:
+            return None
+        if fy in self.infeasible_cohorts:
+            print(f"  [SKIP] Exam {exam.id_examen} (cohort cannot be seated)")
+            self.skipped.append({"id_examen": exam.id_examen, "reason": "infeasible cohort",
+                                 "detail": self.infeasible_cohorts[fy]})
+            return False
+
+        # Largest-room packing first; smaller rooms when its rooms are taken
+        packings = self.cohort_packings[fy]
+        slot = None
+        if preferred_slot is not None:
+            for packs in packings:
+                if self.slot_usable(exam, groups, packs, preferred_slot):
+                    slot = preferred_slot
+                    break
+        if not slot:
+            blocked = self.blocked_days(exam)
+            for packs in packings:
+                slot = self.find_slot(packs, blocked, earliest=self.slot_engine == "dsatur")
+                if slot:
+                    break
+        if not slot:
+            print(f"  [SKIP] Exam {exam.id_examen} (no slot)")
+            self.skipped.append({"id_examen": exam.id_examen, "reason": "no slot"})
+            return False
+
+        # Track if at least one pack was successfully scheduled
+        successfully_scheduled_packs = [
+            pack for pack in packs
+            if self.place_pack(exam, pack, slot, planning_batch, surveillance_batch, groupes_batch)
+        ]
+
+        # ✅ CRITICAL FIX: Mark group days ONCE per exam, AFTER all packs
+        # This prevents fake conflicts between packs of the same exam
+        if successfully_scheduled_packs:
+            self.mark_exam_day(exam, groups, slot)
+            return True
+
+        return False
+
+    def place_pack(self, exam, pack, slot, planning_batch, surveillance_batch, groupes_batch):
+        """
+        Give one pack of exam a room and professors in slot and append
+        its rows to the batches. Returns False (and records the skip) when
+        the pack cannot be seated there. Group days are left to the caller.
+        """
+        room = self.assign_room(pack, slot)
+        if not room:
+            print(f"  [SKIP] No room for pack")
+            self.skipped.append({
+                "id_examen": exam.id_examen,
+                "reason": "no room",
+                "groups": [g.code_groupe for g in pack.groups],
+            })
+            return False
+
+        # ✅ FIX: Pick professors PER PACK (not per exam)
+        # Each pack is a separate physical location that needs supervision
+        pack_profs = self.pick_professors(
+            exam_dept=exam.id_dept,
+            room_type=pack.type,  # Use pack's room type, not global
+            slot=slot,
+            exam_id=exam.id_examen
+        )
+
+        # ✅ CRITICAL: Don't create planning if we don't have enough professors
+        needed = self.required_surveillants(pack.type)
+        if len(pack_profs) < needed:
+            # Release the partial picks: no row will hold them
+            self.unbook_professors(pack_profs, slot)
+            print(f"  [SKIP] Pack for exam {exam.id_examen}: "
+                  f"Insufficient professors ({len(pack_profs)}/{needed})")
+            self.skipped.append({
+                "id_examen": exam.id_examen,
+                "reason": "insufficient professors",
+                "groups": [g.code_groupe for g in pack.groups],
+                "professors": f"{len(pack_profs)}/{needed}",
+            })
+            return False
+
+        # ✅ Batch: Collect planning row (no per-pack round trip)
+        planning_ref = len(planning_batch)
+        planning_batch.append(
+            (exam.id_examen, slot.id_creneau, room.id_lieu)
+        )
+        self.book_room(room, slot)
+
+        # ✅ Batch: Collect surveillance data (pack-specific professors)
+        for p in pack_profs:
+            surveillance_batch.append((self.professors[p].id_prof, planning_ref))
+
+        # Handle merged/split group labels
+        if len(pack.groups) > 1:
+            merged_codes = "+".join(g.code_groupe for g in pack.groups)
+        else:
+            merged_codes = None
+
+        # ✅ Batch: Collect planning_groupes data
+        for g in pack.groups:
+            groupes_batch.append((
+                planning_ref,
+                g.id_groupe,
+                pack.split_part,
+                merged_codes
+            ))
+        return True
+
+    def slot_usable(self, exam, groups, packs, slot):
+        """
+        True when none of the exam's groups (or students) has an exam on
+        the slot's day yet and every pack still finds a room in it.
+        """
+        if self.group_day_busy[[g.idx for g in groups], slot.day].any():
+            return False
+        if self.blocked_days(exam)[slot.day]:
+            return False
+        return self.rooms_fit(packs, slot.idx)
+
+    def mark_exam_day(self, exam, groups, slot):
+        """Record exam on slot's day for its groups, and its students"""
+        self.group_day_busy[[g.idx for g in groups], slot.day] = True
+        self.exam_day[exam.idx] = slot.day
+        if self.clashes is not None:
+            self.clashes.book(exam.idx, slot.day)
+
+    def unmark_exam_day(self, exam, groups, slot):
+        self.group_day_busy[[g.idx for g in groups], slot.day] = False
+        self.exam_day[exam.idx] = -1
+        if self.clashes is not None:
+            self.clashes.unbook(exam.idx, slot.day)
+
+    def blocked_days(self, exam):
+        """
+        Days where some student of exam already sits another exam
+        (all False without enrolments).
+        """
+        if self.clashes is None:
+            return np.zeros(len(self.days), dtype=bool)
+        return self.clashes.clash_days(exam.idx)
+
+    def plan_metrics(self, planning_batch, surveillance_batch, placed, skipped):
+        """
+        Quality figures of a plan: placement counts, professor load
+        spread and how much of the period's days, slots and rooms it uses.
+        """
+        load = np.zeros(len(self.professors), dtype=np.int64)
+        for pid, _ in surveillance_batch:
+            load[self.prof_idx[pid]] += 1
+
+        slots_used = {row[1] for row in planning_batch}
+        days_used = {self.slots[self.slot_idx[c]].day for c in slots_used}
+
+        return {
+            "exams_placed": placed,
+            "exams_skipped": skipped,
+            "packs_placed": len(planning_batch),
+            "surveillances": len(surveillance_batch),
+            "prof_load_min": int(load.min()) if load.size else 0,
+            "prof_load_max": int(load.max()) if load.size else 0,
+            "prof_load_mean": round(float(load.mean()), 3) if load.size else 0,
+            "prof_load_std": round(float(load.std()), 3) if load.size else 0,
+            "days_used": len(days_used),
+            "slots_used": len(slots_used),
+            "room_slot_usage": round(
+                len(planning_batch) / max(1, len(self.rooms) * len(self.slots)), 4
+            ),
+        }
+
+    def plan_rows(self, planning_batch, surveillance_batch, groupes_batch):
+        """
+        JSON-ready view of an in-memory plan: one entry per planning row
+        with its slot, room, professors and groups.
+        """
+        rows = []
+        for id_examen, id_creneau, id_lieu in planning_batch:
+            slot = self.slots[self.slot_idx[id_creneau]]
+            room = self.rooms[self.room_idx[id_lieu]]
+            rows.append({
+                "id_examen": id_examen,
+                "id_creneau": id_creneau,
+                "date": slot.date_str,
+                "heure_debut": slot.heure_debut.strftime('%H:%M'),
+                "id_lieu": id_lieu,
+                "room_type": room.type,
+                "professors": [],
+                "groups": [],
+            })
+
+        for pid, ref in surveillance_batch:
+            rows[ref]["professors"].append(pid)
+
+        for ref, id_groupe, split_part, merged_groups in groupes_batch:
+            rows[ref]["groups"].append({
+                "id_groupe": id_groupe,
+                "code_groupe": self.groups[self.group_idx[id_groupe]].code_groupe,
+                "split_part": split_part,
+                "merged_groups": merged_groups,
+            })
+
+        return rows
+
+    def reserve_planning_ids(self, count):
+        """
+        Reserve `count` id_planning values from the table's sequence
+        in a single round trip.
+        """
+        if count == 0:
+            return []
+        self.cursor.execute("""
+            SELECT nextval(pg_get_serial_sequence('planning_examens', 'id_planning')) AS id
+            FROM generate_series(1, %s)
+        """, (count,))
+        return [r["id"] for r in self.cursor.fetchall()]
+
+    def write_plan(self, planning_batch, surveillance_batch, groupes_batch, version):
+        """
+        Write the whole plan with one COPY per table, under plan version
+        `version`. Surveillance and planning_groupes rows carry the
+        position of their planning row in planning_batch, mapped here to
+        the reserved id_planning values.
+        """
+        planning_ids = self.reserve_planning_ids(len(planning_batch))
+
+        # ✅ BULK COPY: planning_examens
+        print(f"[INFO] Writing {len(planning_batch)} planning_examens...")
+        copy_rows(
+            self.cursor, "planning_examens",
+            ("id_planning", "id_examen", "id_creneau", "id_lieu", "id_version"),
+            ((planning_ids[ref],) + row + (version,) for ref, row in enumerate(planning_batch))
+        )
+
+        # ✅ BULK COPY: surveillances
+        print(f"[INFO] Writing {len(surveillance_batch)} surveillances...")
+        copy_rows(
+            self.cursor, "surveillances",
+            ("id_prof", "id_planning"),
+            ((pid, planning_ids[ref]) for pid, ref in surveillance_batch)
+        )
+
+        # ✅ BULK COPY: planning_groupes
+        print(f"[INFO] Writing {len(groupes_batch)} planning_groupes...")
+        copy_rows(
+            self.cursor, "planning_groupes",
+            ("id_planning", "id_groupe", "split_part", "merged_groups"),
+            ((planning_ids[row[0]],) + row[1:] for row in groupes_batch)
+        )
+
+    def save_stats(self, stats):
+        """
+        Persist the generation's timing summary (generation_runs and
+        generation_phase_stats). Failing to save stats never fails the
+        generation itself.
+        """
+        try:
+            self.cursor.execute("""
+                INSERT INTO generation_runs (id_periode, total_seconds, exams_placed, exams_skipped)
+                VALUES (%s, %s, %s, %s)
+                RETURNING id_run
+            """, (self.period_id, stats["total_seconds"],
+                  stats["exams_placed"], stats["exams_skipped"]))
+            run_id = self.cursor.fetchone()["id_run"]
+
+            copy_rows(
+                self.cursor, "generation_phase_stats",
+                ("id_run", "phase", "seconds", "calls"),
+                ((run_id, name, v["seconds"], v["calls"]) for name, v in stats["phases"].items())
+            )
+            self.conn.commit()
+            stats["id_run"] = run_id
+        except psycopg2.Error as e:
+            self.conn.rollback()
+            print(f"[WARNING] Could not save generation stats: {e}")
+
+    def verify_plan(self, planning_batch, surveillance_batch, groupes_batch):
+        """
+        Check the in-memory plan before it is written:
+        - no professor supervising twice in the same slot
+        - no professor over MAX_DAILY_SURVEILLANCES per day
+        - no room booked twice in the same slot
+        - no group sitting two different exams on the same day
+        - no student sitting two exams on the same day (conflict graph)
+        Returns the list of violations (empty when the plan is valid).
+        """
+        violations = []
+        if not planning_batch:
+            return violations
+
+        plan_exam = np.array([row[0] for row in planning_batch])
+        plan_slot = np.array([self.slot_idx[row[1]] for row in planning_batch])
+        plan_room = np.array([self.room_idx[row[2]] for row in planning_batch])
+        plan_day = self.slot_day[plan_slot]
+
+        def repeated(*columns):
+            keys, counts = np.unique(np.stack(columns, axis=1), axis=0, return_counts=True)
+            return keys, counts
+
+        def slot_label(slot_idx):
+            slot = self.slots[slot_idx]
+            return f"{slot.date} at {slot.heure_debut}"
+
+        # ---- Rooms: one planning row per (room, slot)
+        keys, counts = repeated(plan_room, plan_slot)
+        for (room, slot), n in zip(keys[counts > 1], counts[counts > 1]):
+            violations.append(
+                f"Room {self.rooms[room].id_lieu} booked {n} times on {slot_label(slot)}"
+            )
+
+        # ---- Professors: one surveillance per slot, capped per day
+        if surveillance_batch:
+            surv = np.array(surveillance_batch)
+            surv_prof, surv_ref = surv[:, 0], surv[:, 1]
+
+            keys, counts = repeated(surv_prof, plan_slot[surv_ref])
+            for (pid, slot), n in zip(keys[counts > 1], counts[counts > 1]):
+                violations.append(
+                    f"Professor {pid} supervises {n} exams on {slot_label(slot)}"
+                )
+
+            keys, counts = repeated(surv_prof, plan_day[surv_ref])
+            over = counts > MAX_DAILY_SURVEILLANCES
+            for (pid, day), n in zip(keys[over], counts[over]):
+                violations.append(
+                    f"Professor {pid} has {n} surveillances on {self.days[day]}"
+                )
+
+        # ---- Students: exams sharing a student on the same day
+        if self.clashes is not None:
+            day_of = np.full(len(self.exams), -1, dtype=np.intp)
+            day_of[[self.exam_idx[e] for e in plan_exam]] = plan_day
+            for a, b, day in self.clashes.clashing_pairs(day_of):
+                violations.append(
+                    f"Exams {self.exams[a].id_examen} and {self.exams[b].id_examen} "
+                    f"share students on {self.days[day]}"
+                )
+
+        # ---- Groups: at most one exam per day (packs of one exam share it)
         if groupes_batch:
-            print(f"[INFO] Inserting {len(groupes_batch)} planning_groupes...")
-            execute_values(
-                self.cursor,
-                "INSERT INTO planning_groupes (id_planning, id_groupe, split_part, merged_groups) VALUES %s",
-                groupes_batch
+            grp_ref = np.array([row[0] for row in groupes_batch])
+            grp_id = np.array([row[1] for row in groupes_batch])
+            sittings = np.unique(
+                np.stack((grp_id, plan_day[grp_ref], plan_exam[grp_ref]), axis=1), axis=0
             )
+            keys, counts = repeated(sittings[:, 0], sittings[:, 1])
+            for (gid, day), n in zip(keys[counts > 1], counts[counts > 1]):
+                violations.append(
+                    f"Group {gid} has {n} exams on {self.days[day]}"
+                )
 
-        self.conn.commit()
-        print("[SUCCESS] Planning generation completed")
-        
-        # ✅ VERIFICATION: Check for surveillance conflicts
-        print("\n[VERIFICATION] Checking for surveillance conflicts...")
-        self.verify_no_conflicts()
+        return violations
 
-    def verify_no_conflicts(self):
+    def verify_no_conflicts(self, version):
         """
-        Verify that no professor is assigned to multiple exams at the same time
+        Audit mode: verify in the database that no professor of plan
+        version `version` is assigned to multiple exams at the same time
+        or over the daily limit. Returns the number of problems found.
         """
         self.cursor.execute("""
             SELECT 
@@ -509,10 +2258,11 @@ class ExamScheduler:
             JOIN creneaux c ON c.id_creneau = pe.id_creneau
             JOIN lieux_examen le ON le.id_lieu = pe.id_lieu
             WHERE c.id_periode = %s
+            AND pe.id_version = %s
             GROUP BY p.id_prof, p.nom, c.date, c.heure_debut
             HAVING COUNT(DISTINCT pe.id_planning) > 1
             ORDER BY c.date, c.heure_debut, p.nom
-        """, (self.period_id,))
+        """, (self.period_id, version))
         
         conflicts = self.cursor.fetchall()
         
@@ -537,10 +2287,11 @@ class ExamScheduler:
             JOIN planning_examens pe ON pe.id_planning = s.id_planning
             JOIN creneaux c ON c.id_creneau = pe.id_creneau
             WHERE c.id_periode = %s
+            AND pe.id_version = %s
             GROUP BY p.id_prof, p.nom, c.date
             HAVING COUNT(DISTINCT s.id_planning) > 3
             ORDER BY daily_count DESC, c.date
-        """, (self.period_id,))
+        """, (self.period_id, version))
         
         overloaded = self.cursor.fetchall()
         
@@ -553,25 +2304,109 @@ class ExamScheduler:
         else:
             print("✅ No daily limit violations detected")
 
+        return len(conflicts) + len(overloaded)
+
     def close(self):
-        self.cursor.close()
-        self.conn.close()
+        if self.conn:
+            self.cursor.close()
+            self.conn.close()
+
+
+# --------------------------------------------------
+# PARALLEL MODE WORKER
+# --------------------------------------------------
+def schedule_partition(period_id, data):
+    """
+    Schedule one department partition (see partition_by_department) in a
+    worker process, without database access. Returns the partial plan
+    batches, the ids of exams left unplaced, skip reasons and phase stats.
+    """
+    scheduler = ExamScheduler(period_id, connect=False)
+    scheduler.prepare(data)
+    scheduler.skipped = []
+
+    batches = ([], [], [])
+    placed, unplaced = scheduler.run_waves(scheduler.exams, *batches)
+
+    return {
+        "dept": data["dept"],
+        "batches": batches,
+        "placed": placed,
+        "unplaced": [e.id_examen for e in unplaced],
+        "skipped": scheduler.skipped,
+        "phases": {name: dict(v) for name, v in scheduler.phase_stats.items()},
+    }
+
+
+# --------------------------------------------------
+# MULTI-START WORKER
+# --------------------------------------------------
+def schedule_variant(period_id, data, seed):
+    """
+    Schedule the whole period (input_rows) in a worker process, in the
+    order given by seed (None: the deterministic order). Returns the plan
+    batches, its metrics, the ids of exams left unplaced, skip reasons
+    and phase stats.
+    """
+    scheduler = ExamScheduler(period_id, connect=False)
+    scheduler.prepare(data)
+    scheduler.skipped = []
+    if seed is not None:
+        scheduler.randomize(seed)
+
+    batches = ([], [], [])
+    placed, unplaced = scheduler.run_waves(scheduler.exams, *batches)
+
+    return {
+        "seed": seed,
+        "batches": batches,
+        "placed": placed,
+        "unplaced": [e.id_examen for e in unplaced],
+        "metrics": scheduler.plan_metrics(batches[0], batches[1], placed, len(unplaced)),
+        "skipped": scheduler.skipped,
+        "phases": {name: dict(v) for name, v in scheduler.phase_stats.items()},
+    }
 
     
 # --------------------------------------------------
 # DIRECT FUNCTION CALL (NO SUBPROCESS)
 # --------------------------------------------------
-def generate_planning_for_period(period_id: int):
+def generate_planning_for_period(period_id: int, progress=None, audit=False, dry_run=False,
+                                 parallel=False, improve_seconds=0, slot_engine="waves",
+                                 starts=1, seed=0, force=False, incremental=False,
+                                 closed_rooms=(), unavailable_profs=()):
     """
     ✅ NEW: Function that can be called directly from Flask
     without using subprocess
     
     ✅ TRANSACTION SAFETY: Rolls back on failure
+
+    Returns the generation report: quality metrics, skip reasons and
+    timing stats, plus the proposed plan itself when dry_run is set
+    (in which case nothing is written to the database).
+
+    When the period's plan was already built from identical inputs it is
+    kept as is and the report says "unchanged", unless force is set.
+
+    starts > 1 schedules that many seeded variants in worker processes
+    and keeps the best plan (see ExamScheduler.schedule_multistart).
+
+    With incremental set the existing plan is repaired instead (see
+    ExamScheduler.update): closed_rooms and unavailable_profs are ids of
+    rooms and professors that can no longer be used.
     """
-    scheduler = ExamScheduler(period_id)
+    scheduler = ExamScheduler(period_id, progress=progress, audit=audit, dry_run=dry_run,
+                              parallel=parallel, improve_seconds=improve_seconds,
+                              slot_engine=slot_engine, starts=starts, seed=seed,
+                              force=force)
     try:
-        scheduler.generate()
-        print("[SUCCESS] Planning committed to database")
+        if incremental:
+            report = scheduler.update(closed_rooms, unavailable_profs)
+        else:
+            report = scheduler.generate()
+        if not (dry_run or report["unchanged"]):
+            print("[SUCCESS] Planning committed to database")
+        return report
     except Exception as e:
         print(f"[ERROR] Generation failed: {e}")
         scheduler.conn.rollback()
@@ -585,14 +2420,39 @@ def generate_planning_for_period(period_id: int):
 # ENTRY POINT (for CLI usage)
 # --------------------------------------------------
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python generate_assign.py <period_id>")
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    flags = {a.split("=")[0] for a in sys.argv[1:] if a.startswith("--")}
+    values = dict(a.split("=", 1) for a in sys.argv[1:] if a.startswith("--") and "=" in a)
+
+    if len(args) != 1 or not flags <= {"--audit", "--dry-run", "--parallel", "--improve", "--engine",
+                                           "--starts", "--seed", "--force", "--update",
+                                           "--closed-rooms", "--unavailable-profs"}:
+        print("Usage: python generate_assign.py <period_id> [--audit] [--dry-run] [--parallel] "
+              "[--improve=SECONDS] [--engine=waves|dsatur] [--starts=K [--seed=S]] "
+              "[--force]\n"
+              "       python generate_assign.py <period_id> --update "
+              "[--closed-rooms=ID,...] [--unavailable-profs=ID,...] [--dry-run]")
         sys.exit(1)
 
     try:
-        period_id = int(sys.argv[1])
+        period_id = int(args[0])
     except ValueError:
-        print(f"Error: period_id must be an integer, got '{sys.argv[1]}'")
+        print(f"Error: period_id must be an integer, got '{args[0]}'")
         sys.exit(1)
     
-    generate_planning_for_period(period_id)
+    report = generate_planning_for_period(
+        period_id,
+        audit="--audit" in flags,
+        dry_run="--dry-run" in flags,
+        parallel="--parallel" in flags,
+        improve_seconds=float(values.get("--improve", 10 if "--improve" in flags else 0)),
+        slot_engine=values.get("--engine", "waves"),
+        starts=int(values.get("--starts", 1)),
+        seed=int(values.get("--seed", 0)),
+        force="--force" in flags,
+        incremental="--update" in flags,
+        closed_rooms=[int(v) for v in values.get("--closed-rooms", "").split(",") if v],
+        unavailable_profs=[int(v) for v in values.get("--unavailable-profs", "").split(",") if v],
+    )
+    if "--dry-run" in flags:
+        print(json.dumps(report["metrics"], indent=2))
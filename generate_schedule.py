@@ -1,7 +1,8 @@
 import mysql.connector
 import time
 import sys
-from collections import defaultdict
+
+from student_clash import StudentClashes
 
 # =========================
 # 1️⃣ Database connection
@@ -52,17 +53,28 @@ try:
         r["id_module"]: r["nb"] for r in cursor.fetchall()
     }
 
-    # Student lists per module
-    cursor.execute("SELECT id_module, id_etudiant FROM inscriptions")
-    students_in_module = defaultdict(set)
-    for r in cursor.fetchall():
-        students_in_module[r["id_module"]].add(r["id_etudiant"])
+    # Students of each exam
+    cursor.execute("""
+        SELECT e.id_examen, i.id_etudiant
+        FROM examens e
+        JOIN inscriptions i ON i.id_module = e.id_module
+    """)
+    enrolments = cursor.fetchall()
 
     # =========================
     # 3️⃣ In-memory constraints
     # =========================
 
-    student_exam_day = defaultdict(set)   # student → set(dates)
+    days = sorted({slot["date"] for slot in slots})
+    day_idx = {d: i for i, d in enumerate(days)}
+
+    # Exam and day student sets as bitsets (see student_clash.py)
+    clashes = StudentClashes(
+        [exam["id_examen"] for exam in exams],
+        [r["id_examen"] for r in enrolments],
+        [r["id_etudiant"] for r in enrolments],
+        len(days)
+    )
     room_slot_used = set()                # (room, slot)
 
     # =========================
@@ -71,22 +83,22 @@ try:
 
     insert_rows = []
 
-    for exam in exams:
+    for i, exam in enumerate(exams):
         exam_id = exam["id_examen"]
         module_id = exam["id_module"]
         nb_students = students_per_module.get(module_id, 0)
 
+        # Days where one of the exam's students already has an exam
+        busy_days = clashes.clash_days(i)
+
         placed = False
 
         for slot in slots:
             slot_id = slot["id_creneau"]
-            exam_date = slot["date"]
+            day = day_idx[slot["date"]]
 
             # 🚫 Student constraint: max 1 exam per day
-            if any(
-                exam_date in student_exam_day[s]
-                for s in students_in_module[module_id]
-            ):
+            if busy_days[day]:
                 continue
 
             for room in rooms:
@@ -102,8 +114,7 @@ try:
                 insert_rows.append((exam_id, room_id, slot_id))
                 room_slot_used.add((room_id, slot_id))
 
-                for s in students_in_module[module_id]:
-                    student_exam_day[s].add(exam_date)
+                clashes.book(i, day)
 
                 placed = True
                 break
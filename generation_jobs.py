@@ -0,0 +1,245 @@
+"""
+Background planning generation jobs.
+
+POST /api/periodes/<pid>/generate_planning submits a job here and returns
+its id immediately. generate_planning_for_period itself runs in a pool of
+worker processes, so the CPU-bound scheduling never holds the API's GIL;
+a small thread pool only does the bookkeeping (one thread per running
+job, forwarding the worker's events). Clients poll GET /api/jobs/<id> for
+state, progress and timings, or follow the scheduler's events live
+through progress_events.channel.
+
+Jobs live in process memory, so the API must run as a single gunicorn
+worker process (with threads) for every request to see the same jobs.
+"""
+import os
+import time
+import uuid
+import queue
+import threading
+import traceback
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from db import get_conn
+from progress_events import channel
+
+MAX_WORKERS = int(os.environ.get("GENERATION_WORKERS", 2))
+
+# Finished jobs kept for polling before the oldest are dropped
+MAX_FINISHED_JOBS = 100
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="generation")
+_jobs = {}
+_lock = threading.Lock()
+
+# Worker processes and the manager serving their event queues, started on
+# the first job. spawn: the API process is multi-threaded, fork is not
+# safe there. The workers live on between jobs, so each keeps its
+# reference_cache warm.
+_processes = None
+_manager = None
+
+
+class GenerationJob:
+
+    def __init__(self, period_id: int, options=None):
+        self.id = uuid.uuid4().hex
+        self.period_id = period_id
+        # Keyword options for generate_planning_for_period (e.g. audit)
+        self.options = options or {}
+        self.state = "queued"
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def active(self):
+        return self.state in ("queued", "running")
+
+    def to_dict(self):
+        def ts(t):
+            return datetime.fromtimestamp(t).isoformat() if t else None
+
+        now = time.time()
+        started = self.started_at or now
+        return {
+            "job_id": self.id,
+            "period_id": self.period_id,
+            "options": dict(self.options),
+            "state": self.state,
+            "progress": dict(self.progress),
+            "result": self.result,
+            "error": self.error,
+            "submitted_at": ts(self.submitted_at),
+            "started_at": ts(self.started_at),
+            "finished_at": ts(self.finished_at),
+            "queued_seconds": round(started - self.submitted_at, 2),
+            "run_seconds": round((self.finished_at or now) - started, 2) if self.started_at else None,
+        }
+
+
+def _prune_finished():
+    finished = sorted(
+        (j for j in _jobs.values() if not j.active),
+        key=lambda j: j.finished_at
+    )
+    for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job.id]
+
+
+def _record_generation_time(period_id, elapsed):
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE periodes_examens
+            SET generation_time_seconds = %s,
+                generation_completed_at = NOW()
+            WHERE id_periode = %s
+        """, (round(elapsed, 2), period_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _publish_state(job):
+    channel.publish(job.period_id, {"event": "job", **job.to_dict()})
+
+
+def _on_event(job, event):
+    """Keep the job's progress summary and forward the event, tagged with the job"""
+    if event["event"] == "phase":
+        job.progress["phase"] = event["phase"]
+    elif event["event"] in ("wave", "coloring", "done"):
+        job.progress.update(
+            (k, v) for k, v in event.items()
+            if k in ("wave", "total_waves", "placed", "skipped")
+        )
+    channel.publish(job.period_id, {**event, "job_id": job.id})
+
+
+def _generate(period_id, options, events):
+    """
+    Job body, run in a worker process: the scheduler's events go back
+    through the events queue, closed by None.
+    """
+    from generate_assign import generate_planning_for_period
+
+    try:
+        return generate_planning_for_period(period_id, progress=events.put, **options)
+    finally:
+        events.put(None)
+
+
+def _process_pool():
+    global _processes, _manager
+    with _lock:
+        if _processes is None:
+            context = multiprocessing.get_context("spawn")
+            if _manager is None:
+                _manager = context.Manager()
+            _processes = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=context)
+        return _processes, _manager
+
+
+def _drop_process_pool(pool):
+    """Forget a broken pool (a worker died) so the next job starts a new one"""
+    global _processes
+    with _lock:
+        if _processes is pool:
+            _processes = None
+    pool.shutdown(wait=False)
+
+
+def _run(job):
+    job.state = "running"
+    job.started_at = time.time()
+    _publish_state(job)
+    pool = None
+    try:
+        pool, manager = _process_pool()
+        events = manager.Queue()
+        future = pool.submit(_generate, job.period_id, job.options, events)
+        while True:
+            try:
+                event = events.get(timeout=1)
+            except queue.Empty:
+                if future.done():
+                    break
+                continue
+            if event is None:
+                break
+            _on_event(job, event)
+        report = future.result()
+
+        elapsed = time.time() - job.started_at
+        if not (report["dry_run"] or report["unchanged"] or report.get("incremental")):
+            _record_generation_time(job.period_id, elapsed)
+
+        job.result = {
+            "period_id": job.period_id,
+            "elapsed_seconds": round(elapsed, 2),
+            **report,
+            "message": "Dry run completed, nothing was written" if report["dry_run"]
+                       else "Inputs unchanged, existing planning kept" if report["unchanged"]
+                       else "Planning updated" if report.get("incremental")
+                       else "Planning generated successfully"
+        }
+        job.state = "succeeded"
+    except BrokenProcessPool as e:
+        print(f"Generation error: {traceback.format_exc()}")
+        _drop_process_pool(pool)
+        job.error = f"Generation error: worker process died ({e})"
+        job.state = "failed"
+    except Exception as e:
+        print(f"Generation error: {traceback.format_exc()}")
+        job.error = f"Generation error: {str(e)}"
+        job.state = "failed"
+    finally:
+        job.finished_at = time.time()
+        _publish_state(job)
+
+
+def submit_generation(period_id: int, **options):
+    """
+    Queue a generation for the period and return its job. A period that
+    already has a queued or running job with the same options gets that
+    job back instead.
+
+    Only one job at a time may write a period's plan (generation or
+    update, not dry_run): another one raises ValueError while it is
+    active. Dry runs can run alongside.
+    """
+    with _lock:
+        for job in _jobs.values():
+            if job.period_id == period_id and job.options == options and job.active:
+                return job
+
+        if not options.get("dry_run"):
+            for job in _jobs.values():
+                if job.period_id == period_id and job.active and not job.options.get("dry_run"):
+                    raise ValueError(
+                        f"Period {period_id} already has a {job.state} planning job "
+                        f"({job.id}); wait for it to finish"
+                    )
+
+        _prune_finished()
+        running = {j.id for j in _jobs.values() if j.period_id == period_id and j.active}
+        job = GenerationJob(period_id, options)
+        _jobs[job.id] = job
+
+    channel.start_run(period_id, keep_jobs=running)
+    _publish_state(job)
+    _executor.submit(_run, job)
+    return job
+
+
+def get_job(job_id: str):
+    with _lock:
+        return _jobs.get(job_id)
@@ -0,0 +1,34 @@
+"""
+Apply the database migrations (Database/migrate_*_postgresql.sql).
+
+Each migration is idempotent, so they are all replayed on every start
+(see start.sh), in file name order, each in its own transaction.
+
+Usage: python migrate.py
+"""
+import os
+import glob
+
+from db import get_conn
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Database")
+
+
+def migrate():
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        for path in sorted(glob.glob(os.path.join(MIGRATIONS, "migrate_*_postgresql.sql"))):
+            with open(path, "r", encoding="utf-8") as f:
+                cur.execute(f.read())
+            conn.commit()
+            print(f"[MIGRATE] {os.path.basename(path)} applied")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,311 @@
+"""
+Local-search improvement pass for a generated plan.
+
+Runs after the greedy wave scheduler of generate_assign.py, on the plan
+still held in memory (before verification and writing). Within a time
+budget it repeatedly tries three kinds of moves on the scheduler's own
+occupancy state (rooms x slots, group x day, professor counters):
+
+- insert: place an exam the greedy pass skipped, if needed by first
+  moving one exam out of the target slot to another slot (ejection)
+- relocate: move a placed exam to another slot, with fresh rooms and
+  professors
+- swap: hand one surveillance over to another free professor
+
+Inserts are kept whenever they succeed. Relocations and swaps are
+accepted by simulated annealing on the professors' load spread (sum of
+squared totals), which is updated incrementally at every booking, so a
+move costs a few dict and matrix updates instead of a full re-evaluation.
+"""
+import math
+import time
+import random
+
+import numpy as np
+
+# Annealing temperature, from the start to the end of the time budget
+START_TEMPERATURE = 4.0
+END_TEMPERATURE = 0.05
+
+
+class PlanImprover:
+
+    def __init__(self, scheduler, planning_batch, surveillance_batch, groupes_batch,
+                 unplaced, max_daily, seed=0):
+        self.s = scheduler
+        self.max_daily = max_daily
+        self.rng = random.Random(seed)
+
+        self.exams = {}       # id_examen -> (exam, cohort groups, cohort packings)
+        # id_examen -> {"slot": slot_idx, "packs": [(pack, room, professor idxs)]}
+        self.placements = {}
+        self.order = []       # placed exams in plan order (new ones appended)
+        self.slot_exams = [set() for _ in self.s.slots]
+        # Exams of cohorts without groups or without any packing stay out
+        self.unplaced = [e for e in unplaced if all(self._cohort(e))]
+
+        self.sumsq = sum(t * t for t in self.s.prof_total)
+        self.stats = {"moves": 0, "inserted": 0, "ejections": 0,
+                      "relocated": 0, "swaps": 0}
+
+        self._load_plan(planning_batch, surveillance_batch, groupes_batch)
+
+    # --------------------------------------------------
+    # PLAN <-> PLACEMENTS
+    # --------------------------------------------------
+    def _cohort(self, exam):
+        if exam.id_examen not in self.exams:
+            fy = (exam.id_formation, exam.annee)
+            groups = self.s.groups_by_fy.get(fy, [])
+            packings = self.s.cohort_packings.get(fy, ())
+            self.exams[exam.id_examen] = (exam, groups, packings)
+        return self.exams[exam.id_examen][1:]
+
+    def _load_plan(self, planning_batch, surveillance_batch, groupes_batch):
+        profs_by_ref = [[] for _ in planning_batch]
+        for pid, ref in surveillance_batch:
+            profs_by_ref[ref].append(self.s.prof_idx[pid])
+
+        groups_by_ref = [[] for _ in planning_batch]
+        split_by_ref = {}
+        for ref, gid, split_part, _ in groupes_batch:
+            groups_by_ref[ref].append(gid)
+            split_by_ref[ref] = split_part
+
+        for ref, (exam_id, id_creneau, id_lieu) in enumerate(planning_batch):
+            _, packings = self._cohort(self.s.exams[self.s.exam_idx[exam_id]])
+            key = (tuple(sorted(groups_by_ref[ref])), split_by_ref.get(ref))
+            pack = next(
+                p for packs in packings for p in packs
+                if (tuple(sorted(g.id_groupe for g in p.groups)), p.split_part) == key
+            )
+            slot = self.s.slot_idx[id_creneau]
+            if exam_id not in self.placements:
+                self.placements[exam_id] = {"slot": slot, "packs": []}
+                self.order.append(exam_id)
+                self.slot_exams[slot].add(exam_id)
+            room = self.s.rooms[self.s.room_idx[id_lieu]]
+            self.placements[exam_id]["packs"].append((pack, room, profs_by_ref[ref]))
+
+    def plan(self):
+        """The improved plan as (planning, surveillances, planning_groupes) batches"""
+        planning_batch, surveillance_batch, groupes_batch = [], [], []
+        for exam_id in self.order:
+            placement = self.placements[exam_id]
+            slot = self.s.slots[placement["slot"]]
+            for pack, room, profs in placement["packs"]:
+                ref = len(planning_batch)
+                planning_batch.append((exam_id, slot.id_creneau, room.id_lieu))
+                surveillance_batch.extend((self.s.professors[p].id_prof, ref) for p in profs)
+                merged = "+".join(g.code_groupe for g in pack.groups) \
+                    if len(pack.groups) > 1 else None
+                groupes_batch.extend(
+                    (ref, g.id_groupe, pack.split_part, merged) for g in pack.groups
+                )
+        return planning_batch, surveillance_batch, groupes_batch
+
+    # --------------------------------------------------
+    # BOOKING (keeps sumsq in step with prof_total)
+    # --------------------------------------------------
+    def _book_profs(self, profs, slot_idx, exam_id):
+        for p in profs:
+            self.sumsq += 2 * self.s.prof_total[p] + 1
+        self.s.book_professors(profs, self.s.slots[slot_idx], exam_id)
+
+    def _unbook_profs(self, profs, slot_idx):
+        for p in profs:
+            self.sumsq -= 2 * self.s.prof_total[p] - 1
+        self.s.unbook_professors(profs, self.s.slots[slot_idx])
+
+    def _remove(self, exam_id):
+        """Take a placed exam out of the plan and free everything it held"""
+        placement = self.placements.pop(exam_id)
+        slot_idx = placement["slot"]
+        slot = self.s.slots[slot_idx]
+        for _, room, pids in placement["packs"]:
+            self.s.unbook_room(room, slot)
+            self._unbook_profs(pids, slot_idx)
+        exam, groups, _ = self.exams[exam_id]
+        self.s.unmark_exam_day(exam, groups, slot)
+        self.slot_exams[slot_idx].discard(exam_id)
+        return placement
+
+    def _restore(self, exam_id, placement):
+        """Put back a placement returned by _remove, exactly as it was"""
+        slot_idx = placement["slot"]
+        slot = self.s.slots[slot_idx]
+        for _, room, pids in placement["packs"]:
+            self.s.book_room(room, slot)
+            self._book_profs(pids, slot_idx, exam_id)
+        exam, groups, _ = self.exams[exam_id]
+        self.s.mark_exam_day(exam, groups, slot)
+        self.slot_exams[slot_idx].add(exam_id)
+        self.placements[exam_id] = placement
+
+    def _place(self, exam_id, packs, slot_idx):
+        """
+        Book a room and professors for every pack at slot_idx. All or
+        nothing: returns False (with nothing booked) if any pack fails.
+        """
+        exam, groups, _ = self.exams[exam_id]
+        slot = self.s.slots[slot_idx]
+        done = []
+        for pack in packs:
+            room = self.s.assign_room(pack, slot)
+            if room is not None:
+                self.s.book_room(room, slot)
+                before = self.sumsq
+                pids = self.s.pick_professors(
+                    exam.id_dept, pack.type, slot, exam_id, warn=False
+                )
+                self.sumsq = before + sum(2 * self.s.prof_total[p] - 1 for p in pids)
+                if len(pids) == self.s.required_surveillants(pack.type):
+                    done.append((pack, room, pids))
+                    continue
+                self.s.unbook_room(room, slot)
+                self._unbook_profs(pids, slot_idx)
+
+            for _, booked_room, booked_pids in done:
+                self.s.unbook_room(booked_room, slot)
+                self._unbook_profs(booked_pids, slot_idx)
+            return False
+
+        self.s.mark_exam_day(exam, groups, slot)
+        self.slot_exams[slot_idx].add(exam_id)
+        self.placements[exam_id] = {"slot": slot_idx, "packs": done}
+        return True
+
+    def _free_slots(self, exam_id):
+        """
+        Slots on days where none of the exam's groups (nor, with a conflict
+        graph, any of its students) has an exam yet
+        """
+        exam, groups, _ = self.exams[exam_id]
+        rows = [g.idx for g in groups]
+        busy_days = self.s.group_day_busy[rows].any(axis=0) | self.s.blocked_days(exam)
+        return np.flatnonzero(~busy_days[self.s.slot_day])
+
+    # --------------------------------------------------
+    # MOVES
+    # --------------------------------------------------
+    def insert(self):
+        """Place a skipped exam, ejecting one exam of the target slot if needed"""
+        exam = self.rng.choice(self.unplaced)
+        exam_id = exam.id_examen
+        _, packings = self._cohort(exam)
+
+        free = self._free_slots(exam_id)
+        if not free.size:
+            return False
+        slot_idx = int(self.rng.choice(free))
+
+        # Largest-room packing first, as schedule_exam does
+        if not any(self._place(exam_id, packs, slot_idx) for packs in packings):
+            if not self.slot_exams[slot_idx]:
+                return False
+
+            victim = self.rng.choice(sorted(self.slot_exams[slot_idx]))
+            old = self._remove(victim)
+            if not any(self._place(exam_id, packs, slot_idx) for packs in packings):
+                self._restore(victim, old)
+                return False
+
+            # The ejected exam must land somewhere else, or nothing changes
+            targets = [int(i) for i in self._free_slots(victim) if i != slot_idx]
+            self.rng.shuffle(targets)
+            victim_packs = [pack for pack, _, _ in old["packs"]]
+            if not any(self._place(victim, victim_packs, t) for t in targets[:8]):
+                self._remove(exam_id)
+                self._restore(victim, old)
+                return False
+
+            self.stats["ejections"] += 1
+
+        self.unplaced.remove(exam)
+        self.order.append(exam_id)
+        self.stats["inserted"] += 1
+        return True
+
+    def relocate(self, temperature):
+        """Move a placed exam to another slot"""
+        exam_id = self.rng.choice(self.order)
+        before = self.sumsq
+        old = self._remove(exam_id)
+
+        targets = self._free_slots(exam_id)
+        slot_idx = int(self.rng.choice(targets)) if targets.size else old["slot"]
+        packs = [pack for pack, _, _ in old["packs"]]
+
+        if slot_idx != old["slot"] and self._place(exam_id, packs, slot_idx):
+            if self.accept(self.sumsq - before, temperature):
+                self.stats["relocated"] += 1
+                return True
+            self._remove(exam_id)
+
+        self._restore(exam_id, old)
+        return False
+
+    def swap(self, temperature):
+        """Hand one surveillance of a placed pack to another professor"""
+        exam_id = self.rng.choice(self.order)
+        placement = self.placements[exam_id]
+        _, _, pids = self.rng.choice(placement["packs"])
+        i = self.rng.randrange(len(pids))
+        old_pid = pids[i]
+        new_pid = self.rng.randrange(len(self.s.professors))
+
+        slot_idx = placement["slot"]
+        if (self.s.prof_slot[new_pid, slot_idx] >= 0
+                or self.s.prof_day[new_pid, self.s.slot_day[slot_idx]] >= self.max_daily):
+            return False
+
+        # Incremental delta of the sum of squared loads
+        delta = 2 * (self.s.prof_total[new_pid] - self.s.prof_total[old_pid] + 1)
+        if not self.accept(delta, temperature):
+            return False
+
+        self._unbook_profs([old_pid], placement["slot"])
+        self._book_profs([new_pid], placement["slot"], exam_id)
+        pids[i] = new_pid
+        self.stats["swaps"] += 1
+        return True
+
+    def load_std(self):
+        loads = self.s.prof_total
+        return round(float(np.std(loads)), 2) if loads else 0.0
+
+    def accept(self, delta, temperature):
+        if delta <= 0:
+            return True
+        return self.rng.random() < math.exp(-delta / temperature)
+
+    # --------------------------------------------------
+    # MAIN LOOP
+    # --------------------------------------------------
+    def run(self, budget_seconds):
+        """
+        Apply moves until the time budget is spent (or nothing is left to
+        improve). Returns the move statistics.
+        """
+        start = time.perf_counter()
+        self.stats["prof_load_std_before"] = self.load_std()
+
+        while self.order:
+            elapsed = time.perf_counter() - start
+            if elapsed >= budget_seconds:
+                break
+            progress = elapsed / budget_seconds
+            temperature = START_TEMPERATURE * (END_TEMPERATURE / START_TEMPERATURE) ** progress
+
+            self.stats["moves"] += 1
+            r = self.rng.random()
+            if self.unplaced and r < 0.3:
+                self.insert()
+            elif r < 0.5:
+                self.relocate(temperature)
+            else:
+                self.swap(temperature)
+
+        self.stats["prof_load_std_after"] = self.load_std()
+        self.stats["seconds"] = round(time.perf_counter() - start, 3)
+        return self.stats
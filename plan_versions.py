@@ -0,0 +1,162 @@
+"""
+Versioned plan publishing.
+
+Every generation writes its planning rows under a new plan version
+(plan_versions, status 'staging'). Readers only see the period's active
+version, through the planning_examens_actifs view, so a generation in
+progress is never visible. Once the staged plan is written (and audited,
+if asked) activate() points periodes_examens.active_version at it in one
+short transaction; the version it replaces is retired and kept, up to
+PLAN_VERSIONS_KEPT of them, so rollback() is a pointer switch too.
+
+All functions take a connection and leave committing to the caller.
+"""
+
+# Retired versions kept per period for rollback
+PLAN_VERSIONS_KEPT = 3
+
+
+def create_version(conn, period_id, exams_placed=None, exams_skipped=None, fingerprint=None):
+    """New staging version of the period's plan; returns its id"""
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            INSERT INTO plan_versions (id_periode, exams_placed, exams_skipped, input_fingerprint)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id_version
+        """, (period_id, exams_placed, exams_skipped, fingerprint))
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+
+
+def active_version(conn, period_id):
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT active_version FROM periodes_examens WHERE id_periode = %s",
+                    (period_id,))
+        row = cur.fetchone()
+        return row[0] if row else None
+    finally:
+        cur.close()
+
+
+def activate(conn, period_id, version_id):
+    """
+    Make version_id the period's visible plan and retire the previous
+    one. The period row is locked so concurrent activations serialize.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT 1 FROM periodes_examens WHERE id_periode = %s FOR UPDATE",
+                    (period_id,))
+        cur.execute("""
+            UPDATE plan_versions
+            SET status = 'retired'
+            WHERE id_periode = %s AND status = 'active'
+        """, (period_id,))
+        cur.execute("""
+            UPDATE plan_versions
+            SET status = 'active', activated_at = NOW()
+            WHERE id_version = %s AND id_periode = %s
+        """, (version_id, period_id))
+        if cur.rowcount != 1:
+            raise ValueError(f"Plan version {version_id} does not belong to period {period_id}")
+        cur.execute("UPDATE periodes_examens SET active_version = %s WHERE id_periode = %s",
+                    (version_id, period_id))
+    finally:
+        cur.close()
+
+
+def mark_failed(conn, version_id):
+    cur = conn.cursor()
+    try:
+        cur.execute("UPDATE plan_versions SET status = 'failed' WHERE id_version = %s",
+                    (version_id,))
+    finally:
+        cur.close()
+
+
+def prune(conn, period_id, keep=PLAN_VERSIONS_KEPT):
+    """
+    Delete the period's versions other than the active one and the
+    `keep` most recent retired ones (failed and abandoned staging
+    versions included), with their planning rows. Returns the deleted ids.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT id_version
+            FROM plan_versions
+            WHERE id_periode = %s
+            AND status <> 'active'
+            AND id_version NOT IN (
+                SELECT id_version
+                FROM plan_versions
+                WHERE id_periode = %s AND status = 'retired'
+                ORDER BY id_version DESC
+                LIMIT %s
+            )
+            -- A recent staging version may belong to a generation still running
+            AND NOT (status = 'staging' AND created_at > NOW() - INTERVAL '1 hour')
+        """, (period_id, period_id, keep))
+        drop = [r[0] for r in cur.fetchall()]
+        if drop:
+            for table in ("surveillances", "planning_groupes"):
+                cur.execute(f"""
+                    DELETE FROM {table} t
+                    USING planning_examens pe
+                    WHERE t.id_planning = pe.id_planning
+                    AND pe.id_version = ANY(%s)
+                """, (drop,))
+            cur.execute("DELETE FROM planning_examens WHERE id_version = ANY(%s)", (drop,))
+            cur.execute("DELETE FROM plan_versions WHERE id_version = ANY(%s)", (drop,))
+        return drop
+    finally:
+        cur.close()
+
+
+def list_versions(conn, period_id):
+    """The period's versions, newest first, as dicts"""
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT id_version, status, created_at, activated_at,
+                   exams_placed, exams_skipped
+            FROM plan_versions
+            WHERE id_periode = %s
+            ORDER BY id_version DESC
+        """, (period_id,))
+        columns = [d[0] for d in cur.description]
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+    finally:
+        cur.close()
+
+
+def rollback(conn, period_id, version_id=None):
+    """
+    Re-activate a retired version (by default the most recent one older
+    than the active version). Returns the activated id.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT id_version
+            FROM plan_versions
+            WHERE id_periode = %s
+            AND status = 'retired'
+            AND (%s::INTEGER IS NULL OR id_version = %s)
+            AND (%s::INTEGER IS NOT NULL OR id_version < COALESCE((
+                SELECT active_version FROM periodes_examens WHERE id_periode = %s
+            ), 0))
+            ORDER BY id_version DESC
+            LIMIT 1
+        """, (period_id, version_id, version_id, version_id, period_id))
+        row = cur.fetchone()
+    finally:
+        cur.close()
+
+    if not row:
+        raise ValueError(f"No retired plan version to roll back to for period {period_id}")
+    activate(conn, period_id, row[0])
+    return row[0]
@@ -0,0 +1,66 @@
+"""
+In-process channel for planning generation progress events.
+
+The scheduler (through its generation job) publishes structured events per
+period; every subscriber (one per Server-Sent Events connection) gets its
+own queue. Several jobs of a period (e.g. a dry run during a generation)
+share its channel, so every event carries the job_id of the job that
+published it. The events of the latest runs are kept so that a client
+that connects mid-run first receives what it missed.
+"""
+import queue
+import threading
+from collections import defaultdict
+
+# Events replayed to late subscribers (per period, latest runs only)
+MAX_HISTORY = 500
+
+# Job states after which a run publishes nothing more
+TERMINAL_STATES = ("succeeded", "failed")
+
+
+class ProgressChannel:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(list)
+        self._history = defaultdict(list)
+
+    def start_run(self, period_id, keep_jobs=()):
+        """
+        Forget the previous runs' events for this period, except those of
+        keep_jobs (ids of the period's jobs that are still running).
+        """
+        with self._lock:
+            self._history[period_id] = [
+                e for e in self._history[period_id] if e.get("job_id") in keep_jobs
+            ]
+
+    def publish(self, period_id, event):
+        with self._lock:
+            history = self._history[period_id]
+            history.append(event)
+            if len(history) > MAX_HISTORY:
+                del history[:len(history) - MAX_HISTORY]
+            for q in self._subscribers[period_id]:
+                q.put(event)
+
+    def subscribe(self, period_id):
+        q = queue.Queue()
+        with self._lock:
+            for event in self._history[period_id]:
+                q.put(event)
+            self._subscribers[period_id].append(q)
+        return q
+
+    def unsubscribe(self, period_id, q):
+        with self._lock:
+            if q in self._subscribers[period_id]:
+                self._subscribers[period_id].remove(q)
+
+
+def is_terminal(event):
+    return event.get("event") == "job" and event.get("state") in TERMINAL_STATES
+
+
+channel = ProgressChannel()
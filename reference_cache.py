@@ -0,0 +1,42 @@
+"""
+Process-level cache of the scheduler's reference data.
+
+Rooms, departments, formations, groups, exams, professors (and slots,
+enrolments) barely change between generations, so the rows loaded by
+ExamScheduler.fetch_data are kept here and reused as long as the
+database's reference data version is unchanged. fetch_data sends the
+cached versions along with its load statement, which then only returns
+the stale parts.
+
+The version lives in reference_data_version (a single row) and is bumped
+by statement-level triggers on every table the scheduler reads (see
+procedures_postgresql.sql). A database without that table has no
+version: nothing is cached and every generation loads from scratch.
+"""
+import threading
+
+_lock = threading.Lock()
+_cache = {}
+
+
+def get(name):
+    """(version, value) cached under name, or (None, None)"""
+    with _lock:
+        return _cache.get(name, (None, None))
+
+
+def put(name, version, value):
+    """
+    Keep value for the next callers. Without a version (no
+    reference_data_version table) there is nothing to check it against
+    later, so it is not kept.
+    """
+    if version is None:
+        return
+    with _lock:
+        _cache[name] = (version, value)
+
+
+def clear():
+    with _lock:
+        _cache.clear()
@@ -4,8 +4,10 @@
 echo "Waiting for database..."
 python -c "from db import get_conn; get_conn()" || exit 1
 
-# Run database migrations if needed
-# python migrate.py
+# Run database migrations if needed (idempotent, see migrate.py)
+python migrate.py || exit 1
 
 # Start the application
-gunicorn app_api:app --bind 0.0.0.0:$PORT --workers 2 --timeout 120
+# One worker process with threads: generation jobs are tracked in process
+# memory and run in their own worker processes (see generation_jobs.py)
+gunicorn app_api:app --bind 0.0.0.0:$PORT --workers 1 --threads 8 --timeout 120
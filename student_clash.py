@@ -0,0 +1,92 @@
+"""
+Student-level clash detection over enrolments, with packed bitsets.
+
+Each exam's students are a row of bits over the student index, packed
+into np.uint64 words, and so are the students already sitting an exam
+on each day. An exam clashes with a day when the AND of the two rows is
+not empty. A cohort's student ids are mostly contiguous, so an exam
+only touches a few words and every test is a handful of word
+operations, whatever the number of students.
+
+Used by both schedulers: generate_assign.py (student days of every
+engine, plan verification) and the legacy generate_schedule.py.
+"""
+import numpy as np
+
+
+class StudentClashes:
+    """
+    Students of each exam (in exam_ids order) and of each day's booked
+    exams as bitsets. Enrolments are two parallel id arrays (id_examen,
+    id_etudiant); enrolments of other exams are ignored.
+    """
+
+    def __init__(self, exam_ids, enrolled_exams, enrolled_students, n_days):
+        exam_ids = np.asarray(exam_ids, dtype=np.int64)
+        enrolled_exams = np.asarray(enrolled_exams, dtype=np.int64)
+        enrolled_students = np.asarray(enrolled_students, dtype=np.int64)
+        keep = np.isin(enrolled_exams, exam_ids)
+        order = np.argsort(exam_ids)
+        exam_of = order[np.searchsorted(exam_ids[order], enrolled_exams[keep])]
+        students, student_of = np.unique(enrolled_students[keep], return_inverse=True)
+
+        self.n_students = len(students)
+        n_words = max(1, -(-self.n_students // 64))
+        self.exam_bits = np.zeros((len(exam_ids), n_words), dtype=np.uint64)
+        np.bitwise_or.at(
+            self.exam_bits,
+            (exam_of, student_of // 64),
+            np.left_shift(np.uint64(1), (student_of % 64).astype(np.uint64)),
+        )
+        # Words holding at least one of the exam's students
+        self.exam_words = [np.flatnonzero(row) for row in self.exam_bits]
+
+        self.day_bits = np.zeros((n_days, n_words), dtype=np.uint64)
+        self.day_exams = [set() for _ in range(n_days)]
+
+    def clash_days(self, i):
+        """Boolean vector over days: some student of exam i sits an exam then"""
+        words = self.exam_words[i]
+        return (self.day_bits[:, words] & self.exam_bits[i, words]).any(axis=1)
+
+    def book(self, i, day):
+        words = self.exam_words[i]
+        self.day_bits[day, words] |= self.exam_bits[i, words]
+        self.day_exams[day].add(i)
+
+    def unbook(self, i, day):
+        """
+        Take exam i off day. The day's bits are rebuilt from its other
+        exams, so students shared with them (a clash) stay booked.
+        """
+        self.day_exams[day].discard(i)
+        words = self.exam_words[i]
+        others = np.fromiter(self.day_exams[day], dtype=np.intp)
+        if others.size:
+            self.day_bits[day, words] = np.bitwise_or.reduce(
+                self.exam_bits[others[:, None], words], axis=0
+            )
+        else:
+            self.day_bits[day, words] = 0
+
+    def clashing_pairs(self, exam_days):
+        """
+        (a, b, day) for every pair of exams sharing students on the same
+        day, given the day of each exam (exam idx -> day, -1 unplaced).
+        """
+        pairs = []
+        by_day = {}
+        for i, day in enumerate(exam_days):
+            if day >= 0:
+                by_day.setdefault(int(day), []).append(i)
+        for day, exams in sorted(by_day.items()):
+            seen = np.zeros(self.exam_bits.shape[1], dtype=np.uint64)
+            for k, b in enumerate(exams):
+                words = self.exam_words[b]
+                if (seen[words] & self.exam_bits[b, words]).any():
+                    pairs.extend(
+                        (a, b, day) for a in exams[:k]
+                        if (self.exam_bits[a, words] & self.exam_bits[b, words]).any()
+                    )
+                seen[words] |= self.exam_bits[b, words]
+        return pairs
@@ -0,0 +1,96 @@
+"""
+Synthetic scheduler inputs (the row lists of ExamScheduler.fetch_data),
+so the scheduler can be exercised without a database.
+"""
+import io
+import random
+import datetime
+import contextlib
+
+import numpy as np
+
+from generate_assign import ExamScheduler
+
+
+def dataset(seed=0, cohorts=24, exams_per_cohort=9, professors=60,
+            amphis=((200, 2), (100, 6)), salles=((30, 10),), days=10, enrolments=False):
+    """
+    cohorts of 3 to 6 groups of 25 to 40 students over four departments,
+    rooms given as (capacity, count) pairs, 4 slots a day (no Fridays).
+    With enrolments, each group's students sit every exam of their cohort
+    and a few students of each cohort also sit one exam of the next.
+    """
+    rng = random.Random(seed)
+
+    slots = []
+    day = datetime.date(2026, 1, 5)
+    while len(slots) < 4 * days:
+        if day.weekday() < 4:
+            for hour in (8, 10, 13, 15):
+                slots.append({"id_creneau": len(slots) + 1, "date": day,
+                              "heure_debut": datetime.time(hour)})
+        day += datetime.timedelta(days=1)
+
+    rooms = [{"capacite": cap, "type": "amphi"} for cap, n in amphis for _ in range(n)]
+    rooms += [{"capacite": cap, "type": "salle"} for cap, n in salles for _ in range(n)]
+    rooms.sort(key=lambda r: r["capacite"])
+    rooms = [dict(r, id_lieu=i + 1) for i, r in enumerate(rooms)]
+
+    departments = [1, 2, 3, 4]
+    formations, groups, exams = [], [], []
+    students = {}  # id_formation -> student ids
+    for c in range(cohorts):
+        f, dept = c + 1, departments[c % len(departments)]
+        formations.append({"id_formation": f, "id_dept": dept})
+        students[f] = []
+        for g in range(rng.randint(3, 6)):
+            size = rng.randint(25, 40)
+            groups.append({"id_groupe": len(groups) + 1, "id_formation": f, "annee": "L1",
+                           "effectif": size, "code_groupe": f"{f}-L1-G{g + 1:02d}"})
+            first = sum(len(s) for s in students.values())
+            students[f].extend(range(first, first + size))
+        for _ in range(exams_per_cohort):
+            exams.append({"id_examen": len(exams) + 1, "id_module": len(exams) + 1,
+                          "id_formation": f, "annee": "L1", "id_dept": dept})
+
+    data = {
+        "slots": slots,
+        "rooms": rooms,
+        "departments": departments,
+        "formations": formations,
+        "groups": groups,
+        "exams": exams,
+        "professors": [{"id_prof": p + 1, "id_dept": departments[p % len(departments)]}
+                       for p in range(professors)],
+    }
+
+    if enrolments:
+        pairs = set()
+        for e in exams:
+            pairs.update((e["id_examen"], s) for s in students[e["id_formation"]])
+        for f, ids in students.items():
+            nxt = [e["id_examen"] for e in exams if e["id_formation"] == f % cohorts + 1]
+            for s in rng.sample(ids, 3):
+                pairs.add((rng.choice(nxt), s))
+        pairs = sorted(pairs)
+        data["enrolments"] = (np.array([p[0] for p in pairs], dtype=np.int64),
+                              np.array([p[1] for p in pairs], dtype=np.int64))
+    return data
+
+
+def scheduler(data, **options):
+    """A prepared scheduler without database connection"""
+    s = ExamScheduler(0, connect=False, **options)
+    with contextlib.redirect_stdout(io.StringIO()):
+        s.prepare(data)
+    s.skipped = []
+    return s
+
+
+def schedule(s):
+    """Run the scheduler's slot engine quietly; returns (placed, batches)"""
+    run = s.run_dsatur if s.slot_engine == "dsatur" else s.run_waves
+    batches = ([], [], [])
+    with contextlib.redirect_stdout(io.StringIO()):
+        placed, _ = run(s.exams, *batches)
+    return placed, batches
@@ -0,0 +1,53 @@
+import numpy as np
+
+from conflict_graph import exam_conflict_graph, neighbours, DSaturOrder
+from synthetic import dataset, scheduler, schedule
+
+
+def test_csr_matches_pairwise_sets():
+    rng = np.random.default_rng(5)
+    for _ in range(10):
+        exam_ids = rng.permutation(np.arange(50, 80))
+        student_ids = rng.choice(5_000, 200, replace=False)
+        pairs = [(e, s) for e in exam_ids for s in student_ids if rng.random() < 0.03]
+        pairs += pairs[:10] + [(1, s) for s in student_ids[:30]]
+        exams, students = (np.array(c, dtype=np.int64) for c in zip(*pairs))
+        by_exam = [{s for e, s in pairs if e == x} for x in exam_ids]
+
+        graph = exam_conflict_graph(exam_ids, exams, students)
+        indptr, indices = graph
+        assert len(indptr) == len(exam_ids) + 1
+        for i in range(len(exam_ids)):
+            expected = [j for j in range(len(exam_ids)) if j != i and by_exam[i] & by_exam[j]]
+            assert neighbours(graph, i).tolist() == expected
+
+
+def test_no_enrolments():
+    indptr, indices = exam_conflict_graph([3, 1, 2], [], [])
+    assert indptr.tolist() == [0, 0, 0, 0] and indices.size == 0
+
+
+def test_dsatur_order_visits_every_candidate():
+    graph = exam_conflict_graph([1, 2, 3, 4], [1, 2, 2, 3, 3, 4], [10, 10, 11, 11, 12, 12])
+    order = DSaturOrder(graph, 2, range(4))
+    seen = []
+    for i in order:
+        seen.append(i)
+        order.color(i, len(seen) % 2)
+    assert sorted(seen) == [0, 1, 2, 3]
+
+
+def test_dsatur_engine_has_no_student_clashes():
+    # A few students of each cohort also sit an exam of the next one
+    s = scheduler(dataset(seed=5, enrolments=True, days=12), slot_engine="dsatur")
+    placed, batches = schedule(s)
+    assert placed == len(s.exams)
+    assert not s.verify_plan(*batches)
+
+
+def test_dsatur_engine_without_enrolments():
+    s = scheduler(dataset(seed=5), slot_engine="dsatur")
+    assert s.conflicts[1].size == 0
+    placed, batches = schedule(s)
+    assert placed == len(s.exams)
+    assert not s.verify_plan(*batches)
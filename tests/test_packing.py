@@ -0,0 +1,46 @@
+from collections import Counter
+
+from synthetic import dataset, scheduler, schedule
+
+
+def test_packs_respect_every_room_size():
+    s = scheduler(dataset(seed=5))
+    assert s.pack_limits == [200, 100, 30]
+    for fy, groups in s.groups_by_fy.items():
+        for limit in s.pack_limits:
+            packs = s.create_packs(groups, limit)
+            assert all(p.capacity <= limit for p in packs)
+            seated = Counter()
+            for p in packs:
+                for g in p.groups:
+                    seated[g.idx] += p.capacity if p.split_part else g.effectif
+            assert seated == {g.idx: g.effectif for g in groups}
+
+
+def test_packings_largest_rooms_first():
+    s = scheduler(dataset(seed=5))
+    for fy, packings in s.cohort_packings.items():
+        assert packings[0] == s.cohort_packs[fy] == s.create_packs(s.groups_by_fy[fy])
+        assert [len(p) for p in packings] == sorted(len(p) for p in packings)
+        assert len(set(packings)) == len(packings)
+
+
+def test_mixed_room_sizes_all_placed():
+    # 2 amphis of 200, 6 of 100 and 10 salles of 30: packing every cohort
+    # for the 200 seat amphis alone leaves half the exams unplaced
+    for seed in (1, 2, 5):
+        s = scheduler(dataset(seed=seed))
+        placed, batches = schedule(s)
+        assert placed == len(s.exams)
+        assert not s.verify_plan(*batches)
+        used = {s.rooms[s.room_idx[row[2]]].capacite for row in batches[0]}
+        assert used == {200, 100, 30}
+
+
+def test_cohort_too_large_for_any_packing():
+    data = dataset(seed=5, amphis=((100, 1),), salles=())
+    data["groups"][0]["effectif"] = 250
+    s = scheduler(data)
+    fy = next(fy for fy, groups in s.groups_by_fy.items() if any(g.effectif == 250 for g in groups))
+    assert s.cohort_packings[fy] == ()
+    assert fy in s.infeasible_cohorts
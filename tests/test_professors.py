@@ -0,0 +1,48 @@
+import itertools
+
+import numpy as np
+
+from generate_assign import CROSS_DEPT_PENALTY
+from synthetic import dataset, scheduler, schedule
+
+
+def test_short_packs_release_their_professors():
+    # 12 professors for 10 salles and 8 amphis: many packs come up short
+    s = scheduler(dataset(seed=5, professors=12))
+    placed, (planning, surveillances, _) = schedule(s)
+    assert any(x["reason"] == "insufficient professors" for x in s.skipped)
+    assert sum(s.prof_total) == len(surveillances)
+    assert int((s.prof_slot >= 0).sum()) == len(surveillances)
+    assert int(s.prof_day.sum()) == len(surveillances)
+    assert not s.verify_plan(planning, surveillances, _)
+
+
+def brute_force_cost(s, slot, seat_depts):
+    """Cheapest assignment of distinct free professors to the seats"""
+    free = np.flatnonzero(s.free_professors(slot)).tolist()
+    best = None
+    for profs in itertools.permutations(free, len(seat_depts)):
+        c = sum(s.prof_total[p] + (CROSS_DEPT_PENALTY if s.professors[p].id_dept != d else 0)
+                for p, d in zip(profs, seat_depts))
+        best = c if best is None else min(best, c)
+    return best
+
+
+def test_match_slot_is_optimal():
+    rng = np.random.default_rng(3)
+    for _ in range(30):
+        s = scheduler(dataset(seed=5, professors=7))
+        slot = s.slots[0]
+        # Random loads, some professors already busy in the slot
+        s.prof_total = rng.integers(0, 4, len(s.professors)).tolist()
+        for p in rng.choice(len(s.professors), 2, replace=False):
+            s.prof_slot[p, slot.idx] = 0
+        seat_depts = rng.choice(s.departments, rng.integers(1, 5)).tolist()
+
+        profs = s.match_slot(slot, seat_depts)
+        assert len(profs) == len(set(profs)) == len(seat_depts)
+        assert all(s.free_professors(slot)[profs])
+        cost = sum(s.prof_total[p] + (CROSS_DEPT_PENALTY if s.professors[p].id_dept != d else 0)
+                   for p, d in zip(profs, seat_depts))
+        assert cost == brute_force_cost(s, slot, seat_depts)
+
@@ -0,0 +1,52 @@
+import numpy as np
+
+from student_clash import StudentClashes
+
+
+def random_enrolments(rng, n_exams=12, n_students=300):
+    """Exam ids out of order, sparse student ids over several words"""
+    exam_ids = rng.permutation(np.arange(100, 100 + 3 * n_exams, 3))
+    student_ids = rng.choice(10_000, n_students, replace=False)
+    pairs = [(e, s) for e in exam_ids for s in student_ids if rng.random() < 0.05]
+    pairs += [(e, s) for e, s in pairs[:20]]          # duplicates
+    pairs += [(1, s) for s in student_ids[:50]]       # an exam not in exam_ids
+    exams, students = (np.array(c, dtype=np.int64) for c in zip(*pairs))
+    by_exam = [{s for e, s in pairs if e == x} for x in exam_ids]
+    return exam_ids, exams, students, by_exam
+
+
+def test_bitsets_match_sets():
+    rng = np.random.default_rng(7)
+    for _ in range(10):
+        exam_ids, exams, students, by_exam = random_enrolments(rng)
+        n_days = 4
+        clashes = StudentClashes(exam_ids, exams, students, n_days)
+        assert clashes.n_students == len(set().union(*by_exam))
+
+        days = [set() for _ in range(n_days)]   # exam idx booked per day
+        for step in range(40):
+            i, day = int(rng.integers(len(exam_ids))), int(rng.integers(n_days))
+            if i in days[day] and rng.random() < 0.5:
+                clashes.unbook(i, day)
+                days[day].discard(i)
+            else:
+                clashes.book(i, day)
+                days[day].add(i)
+
+            for i in range(len(exam_ids)):
+                expected = [any(by_exam[i] & by_exam[j] for j in days[d]) for d in range(n_days)]
+                assert clashes.clash_days(i).tolist() == expected
+
+
+def test_clashing_pairs_match_sets():
+    rng = np.random.default_rng(11)
+    for _ in range(10):
+        exam_ids, exams, students, by_exam = random_enrolments(rng)
+        clashes = StudentClashes(exam_ids, exams, students, 3)
+        exam_days = rng.integers(-1, 3, len(exam_ids))
+        expected = sorted(
+            (a, b, int(exam_days[a]))
+            for b in range(len(exam_ids)) for a in range(b)
+            if exam_days[a] >= 0 and exam_days[a] == exam_days[b] and by_exam[a] & by_exam[b]
+        )
+        assert sorted(clashes.clashing_pairs(exam_days)) == expected